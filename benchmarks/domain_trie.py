@@ -0,0 +1,138 @@
+"""
+Compare DomainTrie with the pygtrie-backed implementation it replaced.
+
+    uv run --group dev python benchmarks/domain_trie.py [DOMAIN_SET_FILE]
+
+Without a file, a synthetic domain set is generated.
+"""
+
+import random
+import string
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+from pygtrie import Trie
+
+from rule_set.models import DomainTrie, DomainType
+
+
+class PygtrieDomainTrie:
+    """The previous DomainTrie, reduced to what the benchmark exercises"""
+
+    def __init__(self):
+        self._trie = Trie()
+
+    def add(self, domain: str, domain_type: DomainType):
+        parts = tuple(domain.split(".")[::-1])
+        for _, dt in self._trie.prefixes(parts):
+            if dt == DomainType.DOMAIN_SUFFIX:
+                return
+        self._trie[parts] = domain_type
+        if domain_type != DomainType.DOMAIN_SUFFIX:
+            return
+        for d in self._trie.keys(prefix=parts):
+            if d == parts:
+                continue
+            del self._trie[d]
+
+    def merge(self, other: "PygtrieDomainTrie"):
+        for d, dt in other.iteritems():
+            self.add(d, dt)
+
+    def iteritems(self):
+        for d, dt in self._trie.iteritems():
+            yield ".".join(d[::-1]), dt
+
+    def sorted_iteritems(self):
+        self._trie.enable_sorting(True)
+        yield from self.iteritems()
+        self._trie.enable_sorting(False)
+
+
+def synthetic_domains(count: int) -> list[tuple[str, DomainType]]:
+    rng = random.Random(0)
+    tlds = ["com", "net", "org", "cn", "io", "co.uk", "com.cn"]
+    apexes = [
+        f"{''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12)))}."
+        f"{rng.choice(tlds)}"
+        for _ in range(count // 4)
+    ]
+    items = []
+    for _ in range(count):
+        domain = rng.choice(apexes)
+        for _ in range(rng.choice([0, 0, 1, 1, 2, 3])):
+            domain = f"{''.join(rng.choices(string.ascii_lowercase + string.digits, k=rng.randint(1, 10)))}.{domain}"
+        domain_type = (
+            DomainType.DOMAIN_SUFFIX if rng.random() < 0.6 else DomainType.DOMAIN
+        )
+        items.append((domain, domain_type))
+    return items
+
+
+def load_domain_set(path: Path) -> list[tuple[str, DomainType]]:
+    items = []
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("."):
+            items.append((line[1:], DomainType.DOMAIN_SUFFIX))
+        else:
+            items.append((line, DomainType.DOMAIN))
+    return items
+
+
+def measure(label: str, build: Callable[[], object]) -> object:
+    start = time.perf_counter()
+    trie = build()
+    elapsed = time.perf_counter() - start
+    # Build again under tracemalloc, which would otherwise skew the timing
+    del trie
+    tracemalloc.start()
+    trie = build()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:8.3f}s  retained {retained / 1024**2:8.1f} MiB")
+    return trie
+
+
+def timed(label: str, func: Callable[[], object]) -> None:
+    start = time.perf_counter()
+    func()
+    print(f"{label:<28} {time.perf_counter() - start:8.3f}s")
+
+
+def build(trie_cls: type, items: list[tuple[str, DomainType]]) -> object:
+    trie = trie_cls()
+    for domain, domain_type in items:
+        trie.add(domain, domain_type)
+    return trie
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        items = load_domain_set(Path(sys.argv[1]))
+    else:
+        items = synthetic_domains(300_000)
+    half = len(items) // 2
+    print(f"{len(items)} domains")
+
+    for name, trie_cls in (("pygtrie", PygtrieDomainTrie), ("DomainTrie", DomainTrie)):
+        trie = measure(f"{name} add", lambda cls=trie_cls: build(cls, items))
+        timed(
+            f"{name} sorted_iteritems",
+            lambda trie=trie: sum(1 for _ in trie.sorted_iteritems()),
+        )
+        if trie_cls is DomainTrie:
+            measure(f"{name} from_items", lambda: DomainTrie.from_items(items))
+        left = build(trie_cls, items[:half])
+        right = build(trie_cls, items[half:])
+        timed(f"{name} merge", lambda left=left, right=right: left.merge(right))
+        assert sorted(left.iteritems()) == sorted(trie.iteritems())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Compare the range-based IPTrie with the PyTricia-backed implementation it
+replaced.
+
+    uv run python benchmarks/ip_trie.py [CIDR_LIST_FILE]
+
+Without a file, a synthetic country-sized IPv4 list is generated, made of
+runs of adjacent networks as found in GeoIP databases.
+"""
+
+import random
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from pytricia import PyTricia
+
+from rule_set.models import IPTrie
+
+
+class PyTriciaIPTrie:
+    """The previous IPTrie, reduced to what the benchmark exercises"""
+
+    def __init__(self):
+        self._trie = PyTricia()
+
+    def add(self, ip: str):
+        if self._trie.get_key(ip):
+            return
+        self._trie[ip] = None
+        for prefix in self._trie.children(ip):
+            del self._trie[prefix]
+
+    def merge(self, other: "PyTriciaIPTrie"):
+        for ip in other.iteritems():
+            self.add(ip)
+
+    def iteritems(self):
+        yield from self._trie
+
+
+def synthetic_networks(count: int) -> list[str]:
+    rng = random.Random(0)
+    networks = []
+    while len(networks) < count:
+        # A run of adjacent, equally sized networks, like one allocation split
+        # into several GeoIP records
+        prefixlen = rng.choice([22, 24, 24, 26, 28])
+        address = rng.getrandbits(prefixlen) << (32 - prefixlen)
+        for _ in range(rng.randint(1, 16)):
+            address &= 0xFFFFFFFF
+            networks.append(
+                f"{address >> 24}.{address >> 16 & 255}.{address >> 8 & 255}."
+                f"{address & 255}/{prefixlen}"
+            )
+            address += 1 << (32 - prefixlen)
+    rng.shuffle(networks)
+    return networks
+
+
+def timed(label: str, func: Callable[[], object]) -> object:
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<28} {time.perf_counter() - start:8.3f}s")
+    return result
+
+
+def build(trie_cls: type, networks: list[str]) -> object:
+    trie = trie_cls()
+    for network in networks:
+        trie.add(network)
+    return trie
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        networks = Path(sys.argv[1]).read_text().split()
+    else:
+        networks = synthetic_networks(200_000)
+    half = len(networks) // 2
+    print(f"{len(networks)} networks")
+
+    for name, trie_cls in (("PyTricia", PyTriciaIPTrie), ("IPTrie", IPTrie)):
+        trie = timed(f"{name} add", lambda cls=trie_cls: build(cls, networks))
+        items = timed(f"{name} iteritems", lambda trie=trie: list(trie.iteritems()))
+        left = build(trie_cls, networks[:half])
+        right = build(trie_cls, networks[half:])
+        timed(
+            f"{name} merge",
+            lambda left=left, right=right: (left.merge(right), list(left.iteritems())),
+        )
+        print(f"{name + ' output':<28} {len(items):8d} networks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Time parsers.logic.parse on logical rules, and on rules nested ever deeper.
+
+    uv run python benchmarks/logical_parser.py [RULE_SET_FILE ...]
+
+Pass the skk.moe and AdRules lists to time their AND / OR / NOT rules.
+Without files, synthetic rules of the same shapes are used. The nesting
+table shows how parse time grows with depth, which should be about linear.
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from rule_set.parsers import logic
+
+LOGICAL_PREFIXES = ("AND,", "OR,", "NOT,")
+
+
+def load_logical_rules(paths: list[Path]) -> list[str]:
+    return [
+        line.strip()
+        for path in paths
+        for line in path.read_text().splitlines()
+        if line.strip().upper().startswith(LOGICAL_PREFIXES)
+    ]
+
+
+def synthetic_rules(count: int) -> list[str]:
+    rng = random.Random(0)
+    rules = []
+    for _ in range(count):
+        domain = f"{rng.getrandbits(32):x}.example.com"
+        port = rng.randint(1, 65535)
+        rules.append(
+            rng.choice(
+                (
+                    # skk.moe: QUIC and non-standard ports
+                    f"AND,((DOMAIN-SUFFIX,{domain}),(PROTOCOL,UDP))",
+                    f"AND,((DOMAIN-SUFFIX,{domain}),(NOT,((PROTOCOL,UDP))),"
+                    f"(OR,((DEST-PORT,443),(DEST-PORT,{port}))))",
+                    # AdRules: a domain under a keyword
+                    f"AND,((DOMAIN-KEYWORD,{domain[:6]}),(DOMAIN-SUFFIX,{domain}))",
+                    f"OR,((DOMAIN,{domain}),(DOMAIN,www.{domain}))",
+                )
+            )
+        )
+    return rules
+
+
+def nested_rule(depth: int) -> str:
+    rule = "(DOMAIN,example.com)"
+    for level in range(depth):
+        if level % 2:
+            rule = f"(NOT,({rule}))"
+        else:
+            rule = f"(AND,({rule},(DEST-PORT,{level})))"
+    return rule[1:-1]
+
+
+def timed(rules: list[str], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for rule in rules:
+            logic.parse(rule)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    logger.remove()
+    if len(sys.argv) > 1:
+        rules = load_logical_rules([Path(arg) for arg in sys.argv[1:]])
+    else:
+        rules = synthetic_rules(20_000)
+    assert all(logic.parse(rule) is not None for rule in rules)
+    seconds = timed(rules)
+    print(
+        f"{len(rules)} rules  {seconds:8.3f}s  {seconds / len(rules) * 1e6:8.1f}us/rule"
+    )
+
+    for depth in (8, 32, 128, 256):
+        rule = nested_rule(depth)
+        seconds = timed([rule] * 50)
+        print(f"depth {depth:<4} {seconds / 50 * 1e3:8.3f}ms/rule")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Check is_eTLD against the tldextract call it replaced, then compare their
+first-call and per-query cost.
+
+    uv run --group dev python benchmarks/public_suffix.py [DOMAIN_SET_FILE]
+
+Every rule of the vendored list is checked with a few labels added or
+removed, in mixed case and in punycode, along with the given or synthetic
+domains.
+"""
+
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+from rule_set.utils.domain import PUBLIC_SUFFIX_LIST, is_eTLD
+
+
+def public_suffix_rules() -> list[str]:
+    text = PUBLIC_SUFFIX_LIST.read_text(encoding="utf-8")
+    return [
+        line.split()[0]
+        for line in text.split("// ===END ICANN DOMAINS===")[0].splitlines()
+        if line.strip() and not line.startswith("//")
+    ]
+
+
+def rule_cases(rules: list[str]) -> list[str]:
+    rng = random.Random(0)
+    cases = []
+    for rule in rules:
+        domain = rule.lstrip("!").removeprefix("*.")
+        labels = domain.split(".")
+        cases.extend(
+            (
+                domain,
+                f"www.{domain}",
+                f"a.b.{domain}",
+                ".".join(labels[1:]),
+                "".join(
+                    char.upper() if rng.random() < 0.5 else char for char in domain
+                ),
+            )
+        )
+        if not domain.isascii():
+            cases.append(domain.encode("idna").decode())
+    return [case for case in cases if case]
+
+
+def synthetic_domains(count: int, rules: list[str]) -> list[str]:
+    rng = random.Random(1)
+    alphabet = string.ascii_lowercase + string.digits + "-"
+    suffixes = ["com", "net", "org", "cn", "io", "co.uk", "xn--fiqs8s"]
+    suffixes += rng.sample(rules, 50)
+    return [
+        ".".join(
+            [
+                *(
+                    "".join(rng.choices(alphabet, k=rng.randint(1, 12)))
+                    for _ in range(rng.randint(0, 2))
+                ),
+                rng.choice(suffixes).lstrip("!").removeprefix("*."),
+            ]
+        )
+        for _ in range(count)
+    ]
+
+
+def load_domain_set(path: Path) -> list[str]:
+    return [
+        line.strip().lstrip(".")
+        for line in path.read_text().splitlines()
+        if line.strip() and not line.startswith("#")
+    ]
+
+
+def main() -> None:
+    rules = public_suffix_rules()
+    if len(sys.argv) > 1:
+        domains = load_domain_set(Path(sys.argv[1]))
+    else:
+        domains = synthetic_domains(200_000, rules)
+
+    start = time.perf_counter()
+    import tldextract
+
+    # Offline, from the snapshot bundled with tldextract, as a cold cache
+    # would otherwise fetch the list first
+    extract = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+    extract("example.com")
+    print(f"{'tldextract first call':<24} {time.perf_counter() - start:8.3f}s")
+    start = time.perf_counter()
+    is_eTLD("example.com")
+    print(f"{'is_eTLD first call':<24} {time.perf_counter() - start:8.3f}s")
+
+    def reference(domain: str) -> bool:
+        return domain == extract(domain).suffix
+
+    mismatches = [
+        domain
+        for domain in [*rule_cases(rules), *domains]
+        if is_eTLD(domain) != reference(domain)
+    ]
+    assert not mismatches, mismatches[:10]
+    print(f"{len(rules)} rules, {len(domains)} domains, results identical")
+
+    for name, check in (("tldextract", reference), ("is_eTLD", is_eTLD)):
+        start = time.perf_counter()
+        for domain in domains:
+            check(domain)
+        print(f"{name:<24} {time.perf_counter() - start:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Check validate_domain against the validators.domain call it replaced, then
+compare their speed.
+
+    uv run --group dev python benchmarks/validate_domain.py [DOMAIN_SET_FILE]
+
+Without a file, a synthetic domain set is generated. Either way, randomized
+edge cases (underscores, hyphens, long labels, IDN, whitespace) must agree.
+"""
+
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+import validators
+
+from rule_set.utils import validate_domain
+
+
+def reference(domain: str) -> bool:
+    if "." not in domain:
+        return True
+    return bool(validators.domain(domain, rfc_2782=True))
+
+
+def edge_cases(count: int) -> list[str]:
+    rng = random.Random(0)
+    pieces = [
+        *string.ascii_letters[:6],
+        *string.digits[:3],
+        "-",
+        "_",
+        "__",
+        ".",
+        ".",
+        "..",
+        "xn--",
+        "é",
+        "ü",
+        "中文",
+        "。",
+        " ",
+        "\n",
+        "\t",
+        "*",
+        "a" * 61,
+        "b" * 63,
+        "c" * 64,
+    ]
+    cases = []
+    for _ in range(count):
+        labels = [
+            "".join(rng.choices(pieces, k=rng.randint(0, 4)))
+            for _ in range(rng.randint(1, 5))
+        ]
+        cases.append(".".join(labels))
+    return cases
+
+
+def synthetic_domains(count: int) -> list[str]:
+    rng = random.Random(1)
+    alphabet = string.ascii_lowercase + string.digits + "-"
+    tlds = ["com", "net", "org", "cn", "io", "co.uk", "xn--fiqs8s"]
+    return [
+        ".".join(
+            "".join(rng.choices(alphabet, k=rng.randint(1, 12)))
+            for _ in range(rng.randint(1, 3))
+        )
+        + f".{rng.choice(tlds)}"
+        for _ in range(count)
+    ]
+
+
+def load_domain_set(path: Path) -> list[str]:
+    return [
+        line.strip().lstrip(".")
+        for line in path.read_text().splitlines()
+        if line.strip() and not line.startswith("#")
+    ]
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        domains = load_domain_set(Path(sys.argv[1]))
+    else:
+        domains = synthetic_domains(200_000)
+
+    mismatches = [
+        domain
+        for domain in [*edge_cases(100_000), *domains]
+        if validate_domain(domain) != reference(domain)
+    ]
+    assert not mismatches, mismatches[:10]
+    print(f"{len(domains)} domains, results identical")
+
+    for name, validate in (
+        ("validators", reference),
+        ("validate_domain", validate_domain),
+    ):
+        start = time.perf_counter()
+        for domain in domains:
+            validate(domain)
+        print(f"{name:<16} {time.perf_counter() - start:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
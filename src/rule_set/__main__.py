@@ -1,17 +1,53 @@
 import shutil
+import sys
+from math import inf
+from time import perf_counter
 
+import typer
 from loguru import logger
 
 from .cache import Cache
 from .config import settings
-from .fetcher import fetcher
+from .fetcher import get_async_fetcher, get_fetcher
+from .lookup import load_index
 from .metadata import MetadataStore
-from .processors import ResourceProcessor, SourceProcessor
-from .sources import SOURCES
+from .processors import ResourceProcessor, SourceProcessor, SourceScheduler
+from .sources import get_sources
+
+app = typer.Typer(add_completion=False)
+cache_app = typer.Typer(help="Inspect and prune the on-disk cache.")
+app.add_typer(cache_app, name="cache")
 
 
 def main():
+    """Main entry point"""
+    app()
+
+
+def resource_cache() -> Cache:
+    return Cache(path="resource", max_bytes=settings.resource_cache_max_bytes)
+
+
+def source_cache() -> Cache:
+    return Cache(path="source", max_bytes=settings.source_cache_max_bytes)
+
+
+@app.callback(invoke_without_command=True)
+def build(
+    ctx: typer.Context,
+    offline: bool = typer.Option(
+        False,
+        "--offline",
+        help="Build purely from the fetcher cache without any network access.",
+    ),
+) -> None:
+    """Build every rule set into the build directory."""
+    if ctx.invoked_subcommand is not None:
+        return
+    if offline:
+        settings.offline = True
     metadata_store = None
+    resource_processor = None
     try:
         legacy_metadata_path = settings.metadata_path.with_suffix(".json")
         if not settings.metadata_path.exists() and not legacy_metadata_path.exists():
@@ -19,18 +55,85 @@ def main():
         settings.build_dir.mkdir(parents=True, exist_ok=True)
         settings.cache_dir.mkdir(parents=True, exist_ok=True)
         metadata_store = MetadataStore()
-        resource_processor = ResourceProcessor(Cache(path="resource"))
+        get_async_fetcher().prefetch(get_sources())
+        resource_processor = ResourceProcessor(resource_cache())
         source_processor = SourceProcessor(
-            cache=Cache(path="source"),
+            cache=source_cache(),
             resource_processor=resource_processor,
             metadata_store=metadata_store,
         )
-        for source in SOURCES:
-            source_processor.process(source)
+        SourceScheduler(source_processor).run(get_sources())
     except Exception as e:
         logger.exception(e)
         raise
     finally:
+        if resource_processor is not None:
+            resource_processor.close()
         if metadata_store is not None:
             metadata_store.close()
-        fetcher.close()
+        get_fetcher().close()
+
+
+@cache_app.command("stats")
+def cache_stats() -> None:
+    """Show entry count, size and budget of every cache namespace."""
+    for cache in (get_fetcher().cache, resource_cache(), source_cache()):
+        stats = cache.stats()
+        budget = (
+            "unbounded"
+            if stats.max_bytes is None
+            else f"{stats.max_bytes / 1024**2:.1f} MiB"
+        )
+        print(
+            f"{stats.namespace}: {stats.entries} entries, "
+            f"{stats.size / 1024**2:.1f} MiB of {budget}, {stats.expired} expired"
+        )
+        cache.close()
+
+
+@cache_app.command("prune")
+def cache_prune(
+    remove_all: bool = typer.Option(
+        False, "--all", help="Remove every entry instead of only unusable ones."
+    ),
+) -> None:
+    """Remove expired, over-budget and orphaned cache entries."""
+    for cache in (get_fetcher().cache, resource_cache(), source_cache()):
+        removed_count = cache.prune(remove_all=remove_all)
+        print(f"{cache.namespace}: removed {removed_count} entries")
+        cache.close()
+
+
+@app.command("lookup")
+def lookup(
+    queries: list[str] | None = typer.Argument(
+        None, help="Hostnames or IP addresses, read one per line from stdin if omitted."
+    ),
+) -> None:
+    """Show which rules of which built sources match hostnames or IPs."""
+    # Open without expiry so that lookups never delete the last build
+    cache = Cache(path="source", retention_hours=inf)
+    try:
+        index = load_index(cache, (str(source.name) for source in get_sources()))
+    finally:
+        cache.close()
+
+    count = 0
+    elapsed = 0.0
+    for query in queries or sys.stdin:
+        query = query.strip()
+        if not query:
+            continue
+        start = perf_counter()
+        matches = index.lookup(query)
+        elapsed += perf_counter() - start
+        count += 1
+        if not matches:
+            print(f"{query}\t-")
+        for match in matches:
+            print(f"{query}\t{match.source}\t{match.rule_type},{match.rule}")
+    if count:
+        logger.info(
+            f"{count} lookups over {len(index.sources)} sources, "
+            f"{elapsed / count * 1e6:.1f} µs per lookup"
+        )
@@ -1,96 +1,362 @@
-from datetime import datetime, timedelta
+import json
+import sqlite3
+from datetime import datetime
 from pathlib import Path
-from typing import Any
+from threading import Lock, get_ident
+from time import time
+from typing import Any, BinaryIO
 
 from loguru import logger
 
 from rule_set.config import settings
 
+from .models import CacheStats
 from .utils import generate_cache_key
 
+INDEX_FILENAME = ".index.db"
+INDEX_VERSION = 1
+# Entries past their TTL and the retention period, to be given the retention
+# hours and the current time
+EXPIRED_CONDITION = "mtime + (ttl_hours + ?) * 3600 < ?"
+
 
 class Cache:
-    def __init__(self, *, path: Path | str, ttl_hours: int | None = None) -> None:
+    def __init__(
+        self,
+        *,
+        path: Path | str,
+        ttl_hours: int | None = None,
+        retention_hours: float = 0,
+        max_bytes: int | None = None,
+    ) -> None:
+        self.namespace = str(path)
         self.cache_directory = settings.cache_dir / Path(path)
         self.cache_directory.mkdir(exist_ok=True, parents=True)
         self.ttl_hours = ttl_hours or settings.cache_ttl_hours
+        # Expired entries are kept this much longer so they can be revalidated
+        self.retention_hours = retention_hours
+        # Least recently used entries are evicted once the namespace exceeds this
+        self.max_bytes = max_bytes
+
+        # Entry metadata lives in an index so that hit and expiry checks never
+        # have to stat or scan the cache directory.
+        self.lock = Lock()
+        self.index = sqlite3.connect(
+            self.cache_directory / INDEX_FILENAME, check_same_thread=False
+        )
+        with self.index:
+            self.index.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    ttl_hours REAL NOT NULL,
+                    validators TEXT,
+                    accessed REAL NOT NULL
+                )
+                """
+            )
+        (version,) = self.index.execute("PRAGMA user_version").fetchone()
+        if version < INDEX_VERSION:
+            self._build_index()
 
         # Automatically clean up expired files on initialization
         self.clear_expired()
+        self.evict()
+
+    def _build_index(self) -> None:
+        """Index entries written before the cache had an index, in a single scan"""
+        rows = []
+        for filepath in self.cache_directory.iterdir():
+            if filepath.name.startswith(INDEX_FILENAME) or not filepath.is_file():
+                continue
+            if filepath.suffix == ".tmp":
+                filepath.unlink(missing_ok=True)
+                continue
+            stat = filepath.stat()
+            rows.append(
+                (
+                    filepath.name,
+                    stat.st_size,
+                    stat.st_mtime,
+                    self.ttl_hours,
+                    None,
+                    stat.st_mtime,
+                )
+            )
+        with self.lock, self.index:
+            self.index.executemany(
+                "INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self.index.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        if rows:
+            logger.info(f"Indexed {len(rows)} cache files in {self.cache_directory}")
+
+    def _lookup(self, key: Any) -> tuple[float, float, str | None] | None:
+        with self.lock:
+            return self.index.execute(
+                "SELECT mtime, ttl_hours, validators FROM entries WHERE key = ?",
+                (generate_cache_key(key),),
+            ).fetchone()
 
-    def retrieve(self, key: Any, as_bytes: bool = False) -> str | bytes | None:
+    def retrieve(
+        self, key: Any, as_bytes: bool = False, max_stale_hours: float = 0
+    ) -> str | bytes | None:
         filepath = self.get_file_path(key)
         mode = "rb" if as_bytes else "r"
 
         try:
-            # Check if file exists and is not expired
-            if not filepath.exists():
+            entry = self._lookup(key)
+            if entry is None:
                 logger.info(f'Cache miss for key "{key}": "{filepath}"')
                 return None
 
-            # Check file modification time
-            mtime = datetime.fromtimestamp(filepath.stat().st_mtime)
-            if datetime.now() - mtime > timedelta(hours=self.ttl_hours):
+            # Check entry modification time
+            mtime, ttl_hours, _ = entry
+            age_hours = (time() - mtime) / 3600
+            if age_hours > ttl_hours + self.retention_hours:
                 logger.info(
-                    f'Cache expired for key "{key}" at "{filepath}" (modified: {mtime})'
+                    f'Cache expired for key "{key}" at "{filepath}" '
+                    f"(modified: {datetime.fromtimestamp(mtime)})"
                 )
                 # Remove expired cache file
-                filepath.unlink(missing_ok=True)
+                self._remove([filepath.name])
+                return None
+            if age_hours > ttl_hours + max_stale_hours:
+                logger.info(
+                    f'Cache stale for key "{key}" at "{filepath}" '
+                    f"(modified: {datetime.fromtimestamp(mtime)})"
+                )
                 return None
 
             with filepath.open(mode) as file:
                 cache_content = file.read()
                 if cache_content:
                     logger.success(f'Cache hit for key "{key}" at "{filepath}"')
+                    self._mark_accessed(filepath.name)
                     return cache_content
                 else:
                     logger.info(f'Cache file for key "{key}" is empty: "{filepath}"')
         except FileNotFoundError:
             logger.info(f'Cache miss for key "{key}": "{filepath}"')
+            self._remove([filepath.name])
         except Exception as e:
             logger.warning(f'Error reading cache for key "{key}": {e}')
         return None
 
-    def store(self, key: Any, value: str | bytes) -> Path:
+    def retrieve_path(self, key: Any, max_stale_hours: float = 0) -> Path | None:
+        """Return the file of a usable entry without reading it"""
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        mtime, ttl_hours, _ = entry
+        age_hours = (time() - mtime) / 3600
+        if age_hours > ttl_hours + min(max_stale_hours, self.retention_hours):
+            return None
         filepath = self.get_file_path(key)
+        if not filepath.exists():
+            # Deleted behind the index, e.g. by hand or a concurrent prune
+            self._remove([filepath.name])
+            return None
+        self._mark_accessed(filepath.name)
+        return filepath
+
+    def open(self, key: Any, max_stale_hours: float = 0) -> BinaryIO | None:
+        """
+        Open the file of a usable entry for reading in binary mode.
+
+        An open file stays readable even if the entry is evicted meanwhile,
+        unlike a path returned by retrieve_path.
+        """
+        if (filepath := self.retrieve_path(key, max_stale_hours)) is None:
+            return None
         try:
-            if isinstance(value, bytes):
-                with filepath.open("wb") as file:
-                    file.write(value)
-            else:
-                with filepath.open("w") as file:
-                    file.write(value)
+            return filepath.open("rb")
+        except FileNotFoundError:
+            self._remove([filepath.name])
+            return None
+
+    def contains(self, key: Any, max_stale_hours: float = 0) -> bool:
+        """Check whether a usable entry exists without reading it"""
+        return self.retrieve_path(key, max_stale_hours) is not None
+
+    def retrieve_validators(self, key: Any) -> dict[str, str]:
+        """Return the HTTP validators (ETag / Last-Modified) stored with an entry"""
+        entry = self._lookup(key)
+        if entry is None or entry[2] is None:
+            return {}
+        return json.loads(entry[2])
+
+    def store(
+        self, key: Any, value: str | bytes, validators: dict[str, str] | None = None
+    ) -> Path:
+        filepath = self.get_file_path(key)
+        try:
+            self._write(filepath, value)
+            with self.lock, self.index:
+                self.index.execute(
+                    """
+                    INSERT INTO entries (key, size, mtime, ttl_hours, validators, accessed)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        size = excluded.size,
+                        mtime = excluded.mtime,
+                        ttl_hours = excluded.ttl_hours,
+                        validators = excluded.validators,
+                        accessed = excluded.accessed
+                    """,
+                    (
+                        filepath.name,
+                        filepath.stat().st_size,
+                        now := time(),
+                        self.ttl_hours,
+                        json.dumps(validators) if validators else None,
+                        now,
+                    ),
+                )
             logger.success(f'Successfully cached key "{key}" at "{filepath}"')
+            self.evict(keep=filepath.name)
         except Exception as e:
             logger.error(f'Failed to cache key "{key}" at "{filepath}": {e}')
         return filepath
 
+    def touch(self, key: Any) -> bool:
+        """Mark an entry as fresh again, e.g. after a 304 Not Modified"""
+        filepath = self.get_file_path(key)
+        with self.lock, self.index:
+            cursor = self.index.execute(
+                "UPDATE entries SET mtime = ?, accessed = ? WHERE key = ?",
+                (now := time(), now, filepath.name),
+            )
+        if cursor.rowcount == 0 or not filepath.exists():
+            return False
+        logger.success(f'Revalidated cache for key "{key}" at "{filepath}"')
+        return True
+
+    def _mark_accessed(self, hash_key: str) -> None:
+        with self.lock, self.index:
+            self.index.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (time(), hash_key)
+            )
+
+    @staticmethod
+    def _write(filepath: Path, value: str | bytes) -> None:
+        # Write to a private temporary file and rename it into place so that
+        # concurrent builds never observe a partially written entry.
+        temp_filepath = filepath.with_name(f"{filepath.name}.{get_ident()}.tmp")
+        try:
+            if isinstance(value, bytes):
+                with temp_filepath.open("wb") as file:
+                    file.write(value)
+            else:
+                with temp_filepath.open("w") as file:
+                    file.write(value)
+            temp_filepath.replace(filepath)
+        finally:
+            temp_filepath.unlink(missing_ok=True)
+
+    def _remove(self, keys: list[str]) -> None:
+        for key in keys:
+            (self.cache_directory / key).unlink(missing_ok=True)
+        with self.lock, self.index:
+            self.index.executemany(
+                "DELETE FROM entries WHERE key = ?", ((key,) for key in keys)
+            )
+
     def get_file_path(self, key: Any) -> Path:
         hash_key = generate_cache_key(key)
         return self.cache_directory / hash_key
 
     def clear_expired(self) -> int:
         """Clear all expired cache files and return count of removed files"""
-        if not self.cache_directory.exists():
-            return 0
-
-        removed_count = 0
-        cutoff_time = datetime.now() - timedelta(hours=self.ttl_hours)
-
-        for filepath in self.cache_directory.iterdir():
-            if filepath.is_file():
-                try:
-                    mtime = datetime.fromtimestamp(filepath.stat().st_mtime)
-                    if mtime < cutoff_time:
-                        filepath.unlink()
-                        removed_count += 1
-                        logger.debug(f"Removed expired cache file: {filepath}")
-                except Exception as e:
-                    logger.warning(f"Error checking cache file {filepath}: {e}")
-
-        if removed_count > 0:
+        with self.lock:
+            expired_keys = [
+                key
+                for (key,) in self.index.execute(
+                    f"SELECT key FROM entries WHERE {EXPIRED_CONDITION}",
+                    (self.retention_hours, time()),
+                )
+            ]
+        if expired_keys:
+            self._remove(expired_keys)
             logger.info(
-                f"Cleared {removed_count} expired cache files from {self.cache_directory}"
+                f"Cleared {len(expired_keys)} expired cache files from {self.cache_directory}"
             )
+        return len(expired_keys)
 
+    def evict(self, keep: str | None = None) -> int:
+        """Evict least recently used entries until the namespace fits max_bytes"""
+        if self.max_bytes is None:
+            return 0
+        with self.lock:
+            (total_size,) = self.index.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            if total_size <= self.max_bytes:
+                return 0
+            evicted_keys = []
+            for key, size in self.index.execute(
+                "SELECT key, size FROM entries ORDER BY accessed"
+            ):
+                if total_size <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                evicted_keys.append(key)
+                total_size -= size
+        if not evicted_keys:
+            return 0
+        self._remove(evicted_keys)
+        logger.info(
+            f"Evicted {len(evicted_keys)} least recently used cache files "
+            f"from {self.cache_directory}"
+        )
+        return len(evicted_keys)
+
+    def prune(self, remove_all: bool = False) -> int:
+        """Drop expired, evictable and orphaned entries and return the count"""
+        with self.lock:
+            indexed_keys = {
+                key for (key,) in self.index.execute("SELECT key FROM entries")
+            }
+        if remove_all:
+            self._remove(list(indexed_keys))
+            removed_count = len(indexed_keys)
+        else:
+            missing_keys = [
+                key for key in indexed_keys if not (self.cache_directory / key).exists()
+            ]
+            self._remove(missing_keys)
+            removed_count = self.clear_expired() + self.evict()
+        # Files without an index entry, e.g. left behind by an interrupted write
+        for filepath in self.cache_directory.iterdir():
+            if filepath.name.startswith(INDEX_FILENAME) or not filepath.is_file():
+                continue
+            if filepath.name not in indexed_keys or remove_all:
+                filepath.unlink(missing_ok=True)
+                removed_count += 1
         return removed_count
+
+    def stats(self) -> CacheStats:
+        with self.lock:
+            entries, size, expired = self.index.execute(
+                f"""
+                SELECT
+                    COUNT(*),
+                    COALESCE(SUM(size), 0),
+                    COALESCE(SUM({EXPIRED_CONDITION}), 0)
+                FROM entries
+                """,
+                (self.retention_hours, time()),
+            ).fetchone()
+        return CacheStats(
+            namespace=self.namespace,
+            entries=entries,
+            size=size,
+            max_bytes=self.max_bytes,
+            expired=expired,
+        )
+
+    def close(self) -> None:
+        self.index.close()
@@ -42,6 +42,63 @@ class Settings(BaseSettings):
 
     cache_ttl_hours: int = Field(default=1, ge=0, description="Cache TTL in hours")
 
+    fetcher_cache_max_bytes: int | None = Field(
+        default=2 * 1024**3,
+        gt=0,
+        description="Size budget of the fetcher cache, None for unbounded",
+    )
+
+    resource_cache_max_bytes: int | None = Field(
+        default=1024**3,
+        gt=0,
+        description="Size budget of the parsed resource cache, None for unbounded",
+    )
+
+    source_cache_max_bytes: int | None = Field(
+        default=1024**3,
+        gt=0,
+        description="Size budget of the built source cache, None for unbounded",
+    )
+
+    fetcher_cache_retention_hours: int = Field(
+        default=168,
+        ge=0,
+        description="Hours expired downloads are kept for conditional revalidation",
+    )
+
+    fetcher_max_stale_hours: float = Field(
+        default=24,
+        ge=0,
+        description="Hours past the TTL a download may still be served when fetching fails",
+    )
+
+    offline: bool = Field(
+        default=False, description="Build purely from the fetcher cache"
+    )
+
+    # Build configuration
+    build_workers: int = Field(
+        default=8, gt=0, description="Maximum number of sources built concurrently"
+    )
+
+    mmdb_workers: int | None = Field(
+        default=None,
+        gt=0,
+        description="Processes parsing MaxMind DB resources, None for the CPU count",
+    )
+
+    source_memo_max_entries: int = Field(
+        default=16,
+        ge=0,
+        description="Built sources kept in memory for SourceReference dependents",
+    )
+
+    resource_memo_max_entries: int = Field(
+        default=256,
+        ge=0,
+        description="Parsed resources kept in memory for sources sharing them",
+    )
+
     # HTTP configuration
     http_timeout: int = Field(
         default=10, gt=0, description="HTTP request timeout in seconds"
@@ -51,6 +108,10 @@ class Settings(BaseSettings):
         default=5, ge=0, description="Maximum HTTP retry attempts"
     )
 
+    http_max_connections_per_host: int = Field(
+        default=6, gt=0, description="Maximum concurrent HTTP requests per host"
+    )
+
     http_verify_ssl: bool = Field(default=True, description="Verify SSL certificates")
 
     @field_validator("http_verify_ssl", mode="after")
@@ -33,12 +33,19 @@ class UnknownResourceTypeError(ResourceError):
         super().__init__(f"Unknown resource type: {type(resource)}")
 
 
+class SourceReferenceError(ResourceError):
+    def __init__(self, target: str):
+        self.target = target
+        super().__init__(f"Referenced source has not been built: {target}")
+
+
 __all__ = [
     "FetchError",
     "ParserError",
     "ResourceError",
     "RuleSetError",
     "SerializerError",
+    "SourceReferenceError",
     "UnknownResourceTypeError",
     "UnsupportedRuleTypeError",
 ]
@@ -1,13 +1,47 @@
+import asyncio
+import math
+from collections.abc import Callable, Iterable
+from functools import cache
+from io import BytesIO
 from pathlib import Path
 from time import sleep
+from typing import BinaryIO
+from urllib.parse import urlsplit
 
-from httpx import Client, ConnectError, ConnectTimeout, HTTPTransport, Response
+from httpx import (
+    AsyncClient,
+    AsyncHTTPTransport,
+    Client,
+    ConnectError,
+    ConnectTimeout,
+    HTTPTransport,
+    Response,
+    codes,
+)
 from loguru import logger
 from pydantic import HttpUrl
 
 from .cache import Cache
 from .config import settings
 from .errors import FetchError
+from .models import BaseResource, SourceModel
+
+
+def _conditional_headers(validators: dict[str, str]) -> dict[str, str]:
+    headers = {}
+    if etag := validators.get("etag"):
+        headers["If-None-Match"] = etag
+    if last_modified := validators.get("last-modified"):
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def _response_validators(response: Response) -> dict[str, str]:
+    return {
+        header: response.headers[header]
+        for header in ("etag", "last-modified")
+        if header in response.headers
+    }
 
 
 class Fetcher:
@@ -21,17 +55,26 @@ class Fetcher:
             ),
             follow_redirects=True,
         )
-        self.cache = Cache(path="fetcher")
+        self.cache = Cache(
+            path="fetcher",
+            retention_hours=settings.fetcher_cache_retention_hours,
+            max_bytes=settings.fetcher_cache_max_bytes,
+        )
 
     def close(self) -> None:
         self.http_client.close()
+        self.cache.close()
 
-    def _fetch(self, url: str) -> Response:
+    def _fetch(self, url: str, headers: dict[str, str] | None = None) -> Response:
+        if settings.offline:
+            raise FetchError(f"Offline mode, not fetching URL: {url}")
         last_exception = None
         for attempt in range(self.max_retries + 1):
             try:
-                response = self.http_client.get(url).raise_for_status()
-                return response
+                response = self.http_client.get(url, headers=headers)
+                if response.status_code == codes.NOT_MODIFIED:
+                    return response
+                return response.raise_for_status()
             except (ConnectError, ConnectTimeout) as e:
                 # HTTPTransport already retried connection failures internally.
                 raise FetchError(f"Failed to fetch URL: {e}") from e
@@ -43,28 +86,177 @@ class Fetcher:
             f"Failed to fetch URL after {self.max_retries} retries: {last_exception}"
         ) from last_exception
 
-    def get_content(self, path: HttpUrl | Path) -> str:
-        logger.info(f"Fetching content from: {path}")
+    @staticmethod
+    def _max_stale_hours() -> float:
+        # Offline builds accept anything still retained in the cache
+        return math.inf if settings.offline else settings.fetcher_max_stale_hours
+
+    def _revalidate(self, url: str) -> Response | None:
+        """Fetch url conditionally, returning None if the cached entry is still current."""
+        validators = self.cache.retrieve_validators(url)
+        response = self._fetch(url, _conditional_headers(validators))
+        if response.status_code == codes.NOT_MODIFIED:
+            if self.cache.touch(url):
+                return None
+            response = self._fetch(url)
+        return response
+
+    def _retrieve[T](
+        self,
+        url: str,
+        cached: Callable[[float], T | None],
+        fetched: Callable[[Response, Path], T],
+    ) -> T:
+        """
+        Serve url from the cache, revalidating or downloading it when needed.
+
+        cached looks the entry up given how stale it may be, fetched makes the
+        result from a new response and the file it was stored in.
+        """
+        if (result := cached(0)) is not None:
+            return result
+        try:
+            response = self._revalidate(url)
+        except FetchError as e:
+            if (result := cached(self._max_stale_hours())) is not None:
+                logger.warning(f"Serving stale file for {url}: {e}")
+                return result
+            raise
+        if response is None:
+            if (result := cached(0)) is not None:
+                return result
+            # Evicted right after it was revalidated
+            response = self._fetch(url)
+        filepath = self.cache.store(
+            url, response.content, _response_validators(response)
+        )
+        return fetched(response, filepath)
+
+    def download_file(self, path: HttpUrl | Path) -> Path:
+        """Return the path of a local file, or of the cached copy of a remote one"""
+        if isinstance(path, Path):
+            return path
+        logger.info(f"Downloading file from: {path}")
+        url = path.unicode_string()
+        return self._retrieve(
+            url,
+            lambda max_stale_hours: self.cache.retrieve_path(url, max_stale_hours),
+            lambda _response, filepath: filepath,
+        )
+
+    def open_file(self, path: HttpUrl | Path) -> BinaryIO:
+        """
+        Open a local file, or the cached copy of a remote one, in binary mode.
+
+        Callers read it as a stream, so that large lists are never held in
+        memory whole. The cache entry is opened in the same call that finds it,
+        so that it cannot be evicted in between.
+        """
         if isinstance(path, Path):
-            with path.open() as file:
-                return file.read()
+            return path.open("rb")
+        logger.info(f"Fetching content from: {path}")
         url = path.unicode_string()
-        if cached_content := self.cache.retrieve(url):
-            return cached_content
-        response = self._fetch(url)
-        content = response.text
-        self.cache.store(url, content)
-        return content
-
-    def download_file(self, url: HttpUrl) -> Path:
-        logger.info(f"Downloading file from: {url}")
-        url = url.unicode_string()
-        filepath = self.cache.get_file_path(url)
-        if filepath.exists():
-            return filepath
-        response = self._fetch(url)
-        filepath = self.cache.store(url, response.content)
-        return filepath
-
-
-fetcher = Fetcher()
+        return self._retrieve(
+            url,
+            lambda max_stale_hours: self.cache.open(url, max_stale_hours),
+            lambda response, _filepath: BytesIO(response.content),
+        )
+
+
+class AsyncFetcher:
+    """Warm the fetcher cache concurrently, bounded per host."""
+
+    def __init__(self, cache: Cache) -> None:
+        self.max_retries = settings.http_max_retries
+        self.max_connections_per_host = settings.http_max_connections_per_host
+        self.cache = cache
+        self._host_semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(
+                self.max_connections_per_host
+            )
+        return self._host_semaphores[host]
+
+    async def _fetch(
+        self, client: AsyncClient, url: str, headers: dict[str, str] | None = None
+    ) -> Response:
+        last_exception = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._host_semaphore(url):
+                    response = await client.get(url, headers=headers)
+                if response.status_code == codes.NOT_MODIFIED:
+                    return response
+                return response.raise_for_status()
+            except (ConnectError, ConnectTimeout) as e:
+                # AsyncHTTPTransport already retried connection failures internally.
+                raise FetchError(f"Failed to fetch URL: {e}") from e
+            except Exception as e:
+                last_exception = e
+                if attempt < self.max_retries:
+                    await asyncio.sleep(2**attempt)
+        raise FetchError(
+            f"Failed to fetch URL after {self.max_retries} retries: {last_exception}"
+        ) from last_exception
+
+    async def _prefetch_url(self, client: AsyncClient, url: str) -> None:
+        if self.cache.contains(url):
+            return
+        validators = self.cache.retrieve_validators(url)
+        response = await self._fetch(client, url, _conditional_headers(validators))
+        if response.status_code == codes.NOT_MODIFIED:
+            if self.cache.touch(url):
+                return
+            response = await self._fetch(client, url)
+        # Mirror what Fetcher.download_file would store.
+        self.cache.store(url, response.content, _response_validators(response))
+
+    async def _prefetch(self, urls: set[str]) -> None:
+        # One event loop per prefetch, so the per-host semaphores are too.
+        self._host_semaphores.clear()
+        async with AsyncClient(
+            http2=True,
+            timeout=settings.http_timeout,
+            transport=AsyncHTTPTransport(
+                retries=self.max_retries, verify=settings.http_verify_ssl
+            ),
+            follow_redirects=True,
+        ) as client:
+            results = await asyncio.gather(
+                *(self._prefetch_url(client, url) for url in urls),
+                return_exceptions=True,
+            )
+        for url, result in zip(urls, results, strict=True):
+            if isinstance(result, Exception):
+                # Not fatal: the synchronous fetcher retries when the source is built.
+                logger.warning(f"Failed to prefetch {url}: {result}")
+
+    def prefetch(self, sources: Iterable[SourceModel]) -> None:
+        """Download every remote resource of the given sources into the cache."""
+        if settings.offline:
+            logger.info("Offline mode, skipping prefetch")
+            return
+        urls: set[str] = set()
+        for source in sources:
+            for resource in source.resources:
+                if isinstance(resource, BaseResource) and isinstance(
+                    resource.source, HttpUrl
+                ):
+                    urls.add(resource.source.unicode_string())
+        logger.info(f"Prefetching {len(urls)} remote resources")
+        asyncio.run(self._prefetch(urls))
+
+
+# Built on first use, not on import: MaxMind DB workers are spawned processes
+# that import the CLI module again, and must not open the fetcher cache too.
+@cache
+def get_fetcher() -> Fetcher:
+    return Fetcher()
+
+
+@cache
+def get_async_fetcher() -> AsyncFetcher:
+    return AsyncFetcher(get_fetcher().cache)
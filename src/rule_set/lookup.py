@@ -0,0 +1,233 @@
+import re
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from ipaddress import ip_address
+from math import inf
+
+import ahocorasick
+from loguru import logger
+from pytricia import PyTricia
+
+from .cache import Cache
+from .models import DomainTrie, DomainType, RuleMatch, RuleModel, snapshot
+
+
+class _IndexNode:
+    __slots__ = ("children", "domains", "suffixes", "wildcards")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _IndexNode] = {}
+        # Source lists are only allocated for labels that end a rule
+        self.domains: list[str] | None = None
+        self.suffixes: list[str] | None = None
+        self.wildcards: list[tuple[str, str, re.Pattern]] | None = None
+
+    def child(self, parts: Iterable[str]) -> "_IndexNode":
+        node = self
+        for label in parts:
+            child = node.children.get(label)
+            if child is None:
+                child = node.children[label] = _IndexNode()
+            node = child
+        return node
+
+
+class _RegexSet:
+    """Regexes of one source, tried as a single alternation first"""
+
+    def __init__(self, patterns: list[tuple[str, re.Pattern]]) -> None:
+        self.patterns = patterns
+        try:
+            self.combined = re.compile(
+                "|".join(f"(?:{pattern.pattern})" for _, pattern in patterns),
+                re.IGNORECASE,
+            )
+        except re.error:
+            # e.g. inline global flags, which are only allowed at the start
+            self.combined = None
+
+    def matches(self, hostname: str) -> Iterator[str]:
+        if self.combined is not None and self.combined.search(hostname) is None:
+            return
+        for rule, pattern in self.patterns:
+            if pattern.search(hostname) is not None:
+                yield rule
+
+
+def _wildcard_to_regex(wildcard: str) -> re.Pattern:
+    return re.compile(
+        "".join(
+            ".*" if char == "*" else "." if char == "?" else re.escape(char)
+            for char in wildcard
+        ),
+        re.IGNORECASE,
+    )
+
+
+def _literal_suffix(parts: tuple[str, ...]) -> tuple[str, ...]:
+    """Reversed labels after the last label containing a wildcard character"""
+    for depth, label in enumerate(parts):
+        if "*" in label or "?" in label:
+            return parts[:depth]
+    return parts
+
+
+class RuleIndex:
+    """
+    Multi-source index answering which rules of which sources match a hostname
+    or an IP address.
+
+    Domains and suffixes of every source share one label trie, where
+    wildcards hang off the node of their literal suffix. Keywords share one
+    Aho-Corasick automaton and IP networks one prefix tree per address family,
+    so a lookup mostly costs the same no matter how many sources are loaded.
+    """
+
+    def __init__(self, rules: dict[str, RuleModel]) -> None:
+        self.sources = list(rules)
+        self._root = _IndexNode()
+        keyword_sources: dict[str, list[str]] = defaultdict(list)
+        self._regexes: dict[str, _RegexSet] = {}
+        self._ip_trie = PyTricia(32)
+        self._ip_trie6 = PyTricia(128)
+
+        for source, rule_model in rules.items():
+            regexes = []
+            for parts, domain_type in rule_model.domain_trie.sorted_iterparts():
+                if domain_type == DomainType.DOMAIN_REGEX:
+                    regex = DomainTrie._reversed_parts_to_domain(parts, domain_type)
+                    try:
+                        regexes.append((regex, re.compile(regex, re.IGNORECASE)))
+                    except re.error as e:
+                        logger.warning(f'Skipping regex "{regex}" of "{source}": {e}')
+                elif domain_type == DomainType.DOMAIN_WILDCARD:
+                    wildcard = DomainTrie._reversed_parts_to_domain(parts, domain_type)
+                    node = self._root.child(_literal_suffix(parts))
+                    if node.wildcards is None:
+                        node.wildcards = []
+                    node.wildcards.append(
+                        (source, wildcard, _wildcard_to_regex(wildcard))
+                    )
+                else:
+                    node = self._root.child(parts)
+                    if domain_type == DomainType.DOMAIN_SUFFIX:
+                        if node.suffixes is None:
+                            node.suffixes = []
+                        node.suffixes.append(source)
+                    else:
+                        if node.domains is None:
+                            node.domains = []
+                        node.domains.append(source)
+            if regexes:
+                self._regexes[source] = _RegexSet(regexes)
+
+            for keyword in rule_model.domain_keyword:
+                keyword_sources[keyword.lower()].append(source)
+
+            for ip_trie, shared_trie in (
+                (rule_model.ip_trie, self._ip_trie),
+                (rule_model.ip_trie6, self._ip_trie6),
+            ):
+                for network in ip_trie.iteritems():
+                    if shared_trie.has_key(network):
+                        shared_trie[network].append(source)
+                    else:
+                        shared_trie[network] = [source]
+
+        self._keywords = ahocorasick.Automaton()
+        for keyword, sources in keyword_sources.items():
+            self._keywords.add_word(keyword, (keyword, sources))
+        self._has_keywords = bool(keyword_sources)
+        if self._has_keywords:
+            self._keywords.make_automaton()
+
+    def lookup(self, query: str) -> list[RuleMatch]:
+        """Return every matching rule, most specific first within each kind"""
+        query = query.strip().rstrip(".").lower()
+        try:
+            address = ip_address(query)
+        except ValueError:
+            return self._lookup_hostname(query)
+        return self._lookup_address(str(address), address.version)
+
+    def _lookup_hostname(self, hostname: str) -> list[RuleMatch]:
+        matches = []
+        wildcard_matches = []
+        labels = hostname.split(".")[::-1]
+        node = self._root
+        for depth in range(len(labels) + 1):
+            if node.wildcards is not None:
+                wildcard_matches.extend(
+                    RuleMatch(source=source, rule_type="DOMAIN-WILDCARD", rule=rule)
+                    for source, rule, pattern in node.wildcards
+                    if pattern.fullmatch(hostname) is not None
+                )
+            if depth == len(labels):
+                if node.domains is not None:
+                    matches.extend(
+                        RuleMatch(source=source, rule_type="DOMAIN", rule=hostname)
+                        for source in node.domains
+                    )
+                break
+            node = node.children.get(labels[depth])
+            if node is None:
+                break
+            if node.suffixes is not None:
+                rule = ".".join(labels[depth::-1])
+                matches.extend(
+                    RuleMatch(source=source, rule_type="DOMAIN-SUFFIX", rule=rule)
+                    for source in node.suffixes
+                )
+        # Exact domain and deepest, i.e. longest, suffix first
+        matches.reverse()
+
+        if self._has_keywords:
+            seen = set()
+            for _, (keyword, sources) in self._keywords.iter(hostname):
+                if keyword in seen:
+                    continue
+                seen.add(keyword)
+                matches.extend(
+                    RuleMatch(source=source, rule_type="DOMAIN-KEYWORD", rule=keyword)
+                    for source in sources
+                )
+
+        wildcard_matches.reverse()
+        matches.extend(wildcard_matches)
+        for source, regex_set in self._regexes.items():
+            matches.extend(
+                RuleMatch(source=source, rule_type="DOMAIN-REGEX", rule=rule)
+                for rule in regex_set.matches(hostname)
+            )
+        return matches
+
+    def _lookup_address(self, address: str, version: int) -> list[RuleMatch]:
+        matches = []
+        if version == 4:
+            trie, rule_type = self._ip_trie, "IP-CIDR"
+        else:
+            trie, rule_type = self._ip_trie6, "IP-CIDR6"
+        network = trie.get_key(address)
+        while network is not None:
+            matches.extend(
+                RuleMatch(source=source, rule_type=rule_type, rule=network)
+                for source in trie[network]
+            )
+            network = trie.parent(network)
+        return matches
+
+
+def load_index(cache: Cache, names: Iterable[str]) -> RuleIndex:
+    """Build an index from the rules each source left in the source cache"""
+    rules = {}
+    for name in names:
+        # Lookups read the last build, however old it is
+        cached_result = cache.retrieve(name, as_bytes=True, max_stale_hours=inf)
+        if cached_result is None:
+            logger.warning(f'No built rules for "{name}", run a build first')
+            continue
+        try:
+            rules[name] = snapshot.loads(cached_result)
+        except ValueError as e:
+            logger.warning(f'Ignoring cached rules for "{name}": {e}')
+    return RuleIndex(rules)
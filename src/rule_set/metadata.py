@@ -1,5 +1,6 @@
 import json
 import sqlite3
+from threading import Lock
 
 from .config import settings
 from .models.metadata import MetadataRecord
@@ -11,7 +12,9 @@ class MetadataStore:
         self.legacy_path = self.path.with_suffix(".json")
         needs_migration = not self.path.exists()
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        self.connection = sqlite3.connect(self.path)
+        # Sources are built concurrently, so writes are serialized by a lock.
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.lock = Lock()
         with self.connection:
             self.connection.execute(
                 """
@@ -47,16 +50,17 @@ class MetadataStore:
 
     @property
     def data(self) -> list[MetadataRecord]:
-        return [
-            MetadataRecord(path=path, timestamp=timestamp)
-            for path, timestamp in self.connection.execute(
+        with self.lock:
+            rows = self.connection.execute(
                 "SELECT path, timestamp FROM metadata"
-            )
+            ).fetchall()
+        return [
+            MetadataRecord(path=path, timestamp=timestamp) for path, timestamp in rows
         ]
 
     def update(self, record: MetadataRecord) -> None:
         relative_path = record.path.relative_to(settings.build_dir).as_posix()
-        with self.connection:
+        with self.lock, self.connection:
             self.connection.execute(
                 """
                 INSERT INTO metadata (path, timestamp)
@@ -4,7 +4,9 @@ Contains all data models and related types.
 """
 
 from .artifact import Artifact, ArtifactKind
+from .cache import CacheStats
 from .enum import DomainType, SerializeFormat
+from .lookup import RuleMatch
 from .metadata import MetadataRecord
 from .option import (
     GeoIPOption,
@@ -31,6 +33,7 @@ from .rule import (
     V2rayDomainResult,
 )
 from .source import SourceModel
+from .trie import DomainTrie, IPTrie, IPTrie6
 from .type import SerializeFormats, Source
 from .write import WriteContext
 
@@ -45,6 +48,8 @@ __all__ = [
     "Artifact",
     "WriteContext",
     "MetadataRecord",
+    "CacheStats",
+    "RuleMatch",
     # Options
     "SerializeFormats",
     "V2rayDomainAttrs",
@@ -67,6 +72,9 @@ __all__ = [
     "V2rayDomainResult",
     "V2rayDomainInclude",
     "SerializableRuleModel",
+    "DomainTrie",
+    "IPTrie",
+    "IPTrie6",
     # Sources
     "SourceModel",
 ]
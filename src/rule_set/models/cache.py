@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+
+class CacheStats(BaseModel):
+    namespace: str
+    entries: int
+    size: int
+    max_bytes: int | None
+    expired: int
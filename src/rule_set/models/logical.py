@@ -1,10 +1,31 @@
+"""
+Logical rule trees.
+
+Nodes are immutable, slotted objects. Each one computes its hash and sort
+key once, from those of its children, so hashing, comparing and sorting a
+tree never recurses. Pydantic only sees whole trees, through the schema of
+LogicalTree, which converts them from and to plain dicts.
+
+Parsed and loaded nodes are hash-consed with intern_node: equal subtrees
+such as (PROTOCOL,UDP) are one shared object, and comparing them stops at
+an identity check.
+
+canonicalize rewrites trees into one normal form, so that equivalent
+spellings of a rule collapse into a single set entry, and is_covered finds
+trees that plain rules of the same rule set match already.
+"""
+
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable
 from enum import StrEnum
-from typing import Annotated, Literal, Self
+from threading import Lock
+from typing import Any, NoReturn
+from weakref import WeakValueDictionary
 
-from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic import GetCoreSchemaHandler
+from pydantic_core import core_schema
 
 
 class LogicalOperator(StrEnum):
@@ -38,270 +59,202 @@ class RuleType(StrEnum):
     HOSTNAME_TYPE = "HOSTNAME-TYPE"
 
 
-class ConcreteRule(BaseModel):
+class _Frozen:
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value: object) -> NoReturn:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> NoReturn:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+
+class ConcreteRule(_Frozen):
     """Represents a concrete rule with type and values."""
 
+    __slots__ = ("_hash", "rule_type", "rule_values", "sort_key")
+
     rule_type: RuleType
     rule_values: tuple[str, ...]
+    sort_key: tuple
 
-    @field_validator("rule_values")
-    @classmethod
-    def validate_rule_values(cls, v: tuple[str, ...]) -> tuple[str, ...]:
-        """Validate rule values are not empty."""
-        if not v:
+    def __init__(self, *, rule_type: RuleType, rule_values: Iterable[str]) -> None:
+        rule_values = tuple(rule_values)
+        if not rule_values:
             raise ValueError("Rule values cannot be empty")
-        return tuple(val.strip() for val in v if val.strip())
+        rule_values = tuple(value.strip() for value in rule_values if value.strip())
+        rule_type = RuleType(rule_type)
+        object.__setattr__(self, "rule_type", rule_type)
+        object.__setattr__(self, "rule_values", rule_values)
+        object.__setattr__(self, "sort_key", (rule_type.value, rule_values))
+        object.__setattr__(self, "_hash", hash((rule_type, rule_values)))
 
     def render(self) -> str:
         return f"({self.rule_type.value},{','.join(self.rule_values)})"
 
     def __eq__(self, other: object) -> bool:
-        """Compare two concrete rules for equality."""
+        if self is other:
+            return True
         if not isinstance(other, ConcreteRule):
             return False
-        return (
-            self.rule_type == other.rule_type and self.rule_values == other.rule_values
-        )
+        return self._hash == other._hash and self.sort_key == other.sort_key
 
     def __hash__(self) -> int:
-        """Hash based on rule type and values."""
-        return hash((self.rule_type, self.rule_values))
+        return self._hash
 
     def __lt__(self, other: object) -> bool:
         if not isinstance(other, ConcreteRule):
             return NotImplemented
-        if self.rule_type == other.rule_type:
-            return self.rule_values < other.rule_values
-        return self.rule_type < other.rule_type
+        return self.sort_key < other.sort_key
 
+    def __repr__(self) -> str:
+        return f"ConcreteRule({self.render()})"
 
-class LogicalNode(BaseModel, ABC):
-    """Abstract base class for all logical nodes."""
 
-    parent: LogicalNode | None = Field(default=None, exclude=True, repr=False)
+class LogicalNode(_Frozen, ABC):
+    """
+    Base class for all logical nodes.
 
-    @abstractmethod
-    def get_children(self) -> tuple[LogicalNode, ...]:
-        """Get child nodes."""
-        pass
+    sort_key starts with the priority of the node type, so nodes of
+    different types order by type and keys of different shapes are never
+    compared past their first item.
+    """
 
-    @abstractmethod
-    def render(self, prefix: str = "", is_last: bool = True) -> str:
-        """Render node as string for debugging."""
-        pass
+    __slots__ = ("__weakref__", "_hash", "sort_key")
 
+    node_type: LogicalNodeType
+    sort_key: tuple
 
-class AndNode(LogicalNode):
-    """Represents an AND logical operation."""
+    def _freeze(self, sort_key: object, hashes: object) -> None:
+        object.__setattr__(self, "sort_key", (NODE_PRIORITY[type(self)], sort_key))
+        object.__setattr__(self, "_hash", hash((self.node_type, hashes)))
 
-    children: tuple[LogicalNodeAnnotated, ...] = Field(
-        default_factory=tuple, min_length=2
-    )
-    node_type: Literal[LogicalNodeType.AND] = LogicalNodeType.AND
+    def get_children(self) -> tuple[LogicalNodeUnion, ...]:
+        """Get child nodes."""
+        return ()
 
-    @property
-    def operator(self) -> Literal[LogicalOperator.AND]:
-        return LogicalOperator.AND
-
-    @model_validator(mode="after")
-    def validate_children(self) -> Self:
-        """Ensure AND node has at least 2 children."""
-        if len(self.children) < 2:
-            raise ValueError("AND node must have at least 2 children")
-        # Set parent references
-        for child in self.children:
-            child.parent = self
-        return self
-
-    def get_children(self) -> tuple[LogicalNode, ...]:
-        return self.children
+    @abstractmethod
+    def _fields(self) -> object:
+        """What identifies the node besides its type"""
 
-    def render(self, prefix: str = "", is_last: bool = True) -> str:
-        """Render AND node."""
-        if self.parent is None:
-            result = "AND\n"
+    def _render_children(self, label: str, prefix: str, is_last: bool, is_root: bool):
+        if is_root:
+            result = f"{label}\n"
             new_prefix = ""
         else:
-            result = f"{prefix}{'└── ' if is_last else '├── '}AND\n"
+            result = f"{prefix}{'└── ' if is_last else '├── '}{label}\n"
             new_prefix = prefix + ("    " if is_last else "│   ")
-
-        for i, child in enumerate(self.children):
-            result += child.render(new_prefix, i == len(self.children) - 1)
-
+        children = self.get_children()
+        for i, child in enumerate(children):
+            result += child.render(new_prefix, i == len(children) - 1, False)
         return result
 
+    def render(self, prefix: str = "", is_last: bool = True, is_root: bool = True):
+        """Render node as string for debugging."""
+        return self._render_children(self.node_type.value, prefix, is_last, is_root)
+
     def __eq__(self, other: object) -> bool:
-        """Compare two AND nodes for equality."""
-        if not isinstance(other, AndNode):
-            return False
-        if len(self.children) != len(other.children):
+        if self is other:
+            return True
+        if type(self) is not type(other):
             return False
-        return all(
-            self_child == other_child
-            for self_child, other_child in zip(
-                self.children, other.children, strict=False
-            )
-        )
+        # Interned children are compared by identity first
+        return self._hash == other._hash and self._fields() == other._fields()
 
     def __hash__(self) -> int:
-        """Hash based on node type and children."""
-        return hash((self.node_type, self.children))
+        return self._hash
 
     def __lt__(self, other: object) -> bool:
-        if not isinstance(other, LogicalNode):
+        # Cheaper than an isinstance check against the ABC, sorting calls this a lot
+        if type(other) not in NODE_PRIORITY:
             return NotImplemented
-        if type(self) is not type(other):
-            return NODE_PRIORITY[type(self)] < NODE_PRIORITY[type(other)]
-        return self.children < other.children
+        return self.sort_key < other.sort_key
 
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}{self.get_children()!r}"
 
-class OrNode(LogicalNode):
-    """Represents an OR logical operation."""
 
-    children: tuple[LogicalNodeAnnotated, ...] = Field(
-        default_factory=tuple, min_length=2
-    )
-    node_type: Literal[LogicalNodeType.OR] = LogicalNodeType.OR
+class _OperatorNode(LogicalNode):
+    __slots__ = ("children",)
 
-    @property
-    def operator(self) -> Literal[LogicalOperator.OR]:
-        return LogicalOperator.OR
-
-    @model_validator(mode="after")
-    def validate_children(self) -> Self:
-        """Ensure OR node has at least 2 children."""
-        if len(self.children) < 2:
-            raise ValueError("OR node must have at least 2 children")
-        # Set parent references
-        for child in self.children:
-            child.parent = self
-        return self
-
-    def get_children(self) -> tuple[LogicalNode, ...]:
+    children: tuple[LogicalNodeUnion, ...]
+
+    def __init__(self, *, children: Iterable[LogicalNodeUnion]) -> None:
+        children = tuple(children)
+        if len(children) < 2:
+            raise ValueError(f"{self.node_type} node must have at least 2 children")
+        object.__setattr__(self, "children", children)
+        self._freeze(
+            tuple(child.sort_key for child in children),
+            tuple(child._hash for child in children),
+        )
+
+    def get_children(self) -> tuple[LogicalNodeUnion, ...]:
         return self.children
 
-    def render(self, prefix: str = "", is_last: bool = True) -> str:
-        """Render OR node."""
-        if self.parent is None:
-            result = "OR\n"
-            new_prefix = ""
-        else:
-            result = f"{prefix}{'└── ' if is_last else '├── '}OR\n"
-            new_prefix = prefix + ("    " if is_last else "│   ")
+    def _fields(self) -> object:
+        return self.children
 
-        for i, child in enumerate(self.children):
-            result += child.render(new_prefix, i == len(self.children) - 1)
 
-        return result
+class AndNode(_OperatorNode):
+    """Represents an AND logical operation."""
 
-    def __eq__(self, other: object) -> bool:
-        """Compare two OR nodes for equality."""
-        if not isinstance(other, OrNode):
-            return False
-        if len(self.children) != len(other.children):
-            return False
-        return all(
-            self_child == other_child
-            for self_child, other_child in zip(
-                self.children, other.children, strict=False
-            )
-        )
+    __slots__ = ()
 
-    def __hash__(self) -> int:
-        """Hash based on node type and children."""
-        return hash((self.node_type, self.children))
+    node_type = LogicalNodeType.AND
+    operator = LogicalOperator.AND
 
-    def __lt__(self, other: object) -> bool:
-        if not isinstance(other, LogicalNode):
-            return NotImplemented
-        if type(self) is not type(other):
-            return NODE_PRIORITY[type(self)] < NODE_PRIORITY[type(other)]
-        return self.children < other.children
 
+class OrNode(_OperatorNode):
+    """Represents an OR logical operation."""
 
-class NotNode(LogicalNode):
-    """Represents a NOT logical operation."""
+    __slots__ = ()
 
-    child: LogicalNodeAnnotated = Field(
-        description="The single child node for NOT operation"
-    )
-    node_type: Literal[LogicalNodeType.NOT] = LogicalNodeType.NOT
+    node_type = LogicalNodeType.OR
+    operator = LogicalOperator.OR
 
-    @property
-    def operator(self) -> Literal[LogicalOperator.NOT]:
-        return LogicalOperator.NOT
-
-    @model_validator(mode="after")
-    def validate_child(self) -> Self:
-        """Ensure NOT node has exactly one child."""
-        if not hasattr(self, "child"):
-            raise ValueError("NOT node must have exactly one child")
-        # Set parent reference
-        self.child.parent = self
-        return self
-
-    def get_children(self) -> tuple[LogicalNode, ...]:
-        return (self.child,)
 
-    def render(self, prefix: str = "", is_last: bool = True) -> str:
-        """Render NOT node."""
-        if self.parent is None:
-            result = "NOT\n"
-            new_prefix = ""
-        else:
-            result = f"{prefix}{'└── ' if is_last else '├── '}NOT\n"
-            new_prefix = prefix + ("    " if is_last else "│   ")
+class NotNode(LogicalNode):
+    """Represents a NOT logical operation."""
 
-        result += self.child.render(new_prefix, True)
-        return result
+    __slots__ = ("child",)
 
-    def __eq__(self, other: object) -> bool:
-        """Compare two NOT nodes for equality."""
-        if not isinstance(other, NotNode):
-            return False
-        return self.child == other.child
+    node_type = LogicalNodeType.NOT
+    operator = LogicalOperator.NOT
+    child: LogicalNodeUnion
 
-    def __hash__(self) -> int:
-        """Hash based on node type and child."""
-        return hash((self.node_type, self.child))
+    def __init__(self, *, child: LogicalNodeUnion) -> None:
+        object.__setattr__(self, "child", child)
+        self._freeze(child.sort_key, child._hash)
 
-    def __lt__(self, other: object) -> bool:
-        if not isinstance(other, LogicalNode):
-            return NotImplemented
-        if type(self) is not type(other):
-            return NODE_PRIORITY[type(self)] < NODE_PRIORITY[type(other)]
-        return self.child < other.child
+    def get_children(self) -> tuple[LogicalNodeUnion, ...]:
+        return (self.child,)
+
+    def _fields(self) -> object:
+        return self.child
 
 
 class RuleNode(LogicalNode):
     """Represents a concrete rule."""
 
+    __slots__ = ("rule",)
+
+    node_type = LogicalNodeType.RULE
     rule: ConcreteRule
-    node_type: Literal[LogicalNodeType.RULE] = LogicalNodeType.RULE
 
-    def get_children(self) -> tuple[LogicalNode, ...]:
-        return ()
+    def __init__(self, *, rule: ConcreteRule) -> None:
+        object.__setattr__(self, "rule", rule)
+        self._freeze(rule.sort_key, rule._hash)
+
+    def _fields(self) -> object:
+        return self.rule.sort_key
 
-    def render(self, prefix: str = "", is_last: bool = True) -> str:
+    def render(self, prefix: str = "", is_last: bool = True, is_root: bool = True):
         """Render rule node."""
         return f"{prefix}{'└── ' if is_last else '├── '}{self.rule.render()}\n"
 
-    def __eq__(self, other: object) -> bool:
-        """Compare two rule nodes for equality."""
-        if not isinstance(other, RuleNode):
-            return False
-        return self.rule == other.rule
-
-    def __hash__(self) -> int:
-        """Hash based on node type and rule."""
-        return hash((self.node_type, self.rule))
-
-    def __lt__(self, other: object) -> bool:
-        if not isinstance(other, LogicalNode):
-            return NotImplemented
-        if type(self) is not type(other):
-            return NODE_PRIORITY[type(self)] < NODE_PRIORITY[type(other)]
-        return self.rule < other.rule
+    def __repr__(self) -> str:
+        return f"RuleNode({self.rule.render()})"
 
 
 NODE_PRIORITY = {
@@ -311,31 +264,199 @@ NODE_PRIORITY = {
     OrNode: 3,
 }
 LogicalNodeUnion = AndNode | OrNode | NotNode | RuleNode
-LogicalNodeAnnotated = Annotated[LogicalNodeUnion, Field(discriminator="node_type")]
-
 
-class LogicalTree(BaseModel):
+# Keys hold the children of a node, which stay alive as long as the node does,
+# and entries go away with their node
+_interned: WeakValueDictionary[tuple, LogicalNode] = WeakValueDictionary()
+# Sources are built on several threads, and WeakValueDictionary.setdefault
+# is not atomic: without the lock two equal nodes could both be registered
+_interned_lock = Lock()
+
+
+def intern_node[T: LogicalNode](node: T) -> T:
+    """
+    Return the shared node equal to node, registering node if there is none.
+
+    The children of node must be interned already.
+    """
+    key = (type(node), node._fields())
+    with _interned_lock:
+        return _interned.setdefault(key, node)
+
+
+def _canonical(node: LogicalNodeUnion, memo: dict) -> LogicalNodeUnion:
+    if (done := memo.get(node)) is not None:
+        return done
+    if type(node) is RuleNode:
+        result = node
+    elif type(node) is NotNode:
+        child = _canonical(node.child, memo)
+        if type(child) is NotNode:
+            result = child.child
+        elif child is node.child:
+            result = node
+        else:
+            result = intern_node(NotNode(child=child))
+    else:
+        children: dict[LogicalNodeUnion, None] = {}
+        for child in node.children:
+            child = _canonical(child, memo)
+            if type(child) is type(node):
+                # Children of a canonical node are canonical already
+                children.update(dict.fromkeys(child.children))
+            else:
+                children[child] = None
+        ordered = sorted(children)
+        if len(ordered) == 1:
+            result = ordered[0]
+        elif tuple(ordered) == node.children:
+            result = node
+        else:
+            result = intern_node(type(node)(children=ordered))
+    memo[node] = result
+    return result
+
+
+def canonicalize(trees: Iterable[LogicalTree]) -> set[LogicalTree]:
+    """
+    Rewrite trees into their canonical form.
+
+    Nested nodes of the same operator are flattened, double negations are
+    removed and the children of AND/OR nodes are deduplicated and sorted.
+    A tree that reduces to a single rule keeps its original form, since the
+    root of a tree must be an operation.
+    """
+    memo: dict[LogicalNodeUnion, LogicalNodeUnion] = {}
+    result = set()
+    for tree in trees:
+        root = _canonical(tree.root, memo)
+        if root is tree.root or type(root) is RuleNode:
+            result.add(tree)
+        else:
+            result.add(LogicalTree(root=root))
+    return result
+
+
+def is_covered(
+    node: LogicalNodeUnion,
+    rule_is_covered: Callable[[ConcreteRule], bool],
+    memo: dict[LogicalNodeUnion, bool],
+) -> bool:
+    """
+    Whether everything node matches is matched by the rules rule_is_covered
+    accepts, making a logical rule with this root redundant.
+
+    Negations are never considered covered.
+    """
+    if (done := memo.get(node)) is not None:
+        return done
+    if type(node) is RuleNode:
+        result = rule_is_covered(node.rule)
+    elif type(node) is AndNode:
+        result = any(
+            is_covered(child, rule_is_covered, memo) for child in node.children
+        )
+    elif type(node) is OrNode:
+        result = all(
+            is_covered(child, rule_is_covered, memo) for child in node.children
+        )
+    else:
+        result = False
+    memo[node] = result
+    return result
+
+
+def _node_to_dict(node: LogicalNodeUnion) -> dict[str, Any]:
+    if type(node) is RuleNode:
+        rule = {
+            "rule_type": node.rule.rule_type.value,
+            "rule_values": node.rule.rule_values,
+        }
+        return {"rule": rule, "node_type": node.node_type.value}
+    if type(node) is NotNode:
+        return {"child": _node_to_dict(node.child), "node_type": node.node_type.value}
+    return {
+        "children": [_node_to_dict(child) for child in node.children],
+        "node_type": node.node_type.value,
+    }
+
+
+def _node_from_dict(data: dict[str, Any]) -> LogicalNodeUnion:
+    node_type = LogicalNodeType(data["node_type"])
+    if node_type == LogicalNodeType.RULE:
+        return intern_node(RuleNode(rule=ConcreteRule(**data["rule"])))
+    if node_type == LogicalNodeType.NOT:
+        return intern_node(NotNode(child=_node_from_dict(data["child"])))
+    node_cls = AndNode if node_type == LogicalNodeType.AND else OrNode
+    children = [_node_from_dict(child) for child in data["children"]]
+    return intern_node(node_cls(children=children))
+
+
+class LogicalTree(_Frozen):
     """Container for logical rule trees."""
 
-    root: AndNode | OrNode | NotNode = Field(
-        discriminator="node_type"
-    )  # Only logical operation nodes as root
+    __slots__ = ("root",)
+
+    root: AndNode | OrNode | NotNode  # Only logical operation nodes as root
+
+    def __init__(self, *, root: AndNode | OrNode | NotNode) -> None:
+        if type(root) is RuleNode:
+            raise ValueError("The root of a logical tree must be an operation")
+        object.__setattr__(self, "root", root)
+
+    @property
+    def sort_key(self) -> tuple:
+        return self.root.sort_key
 
     def render(self) -> str:
         """Render tree as string for debugging."""
         return self.root.render()
 
     def __eq__(self, other: object) -> bool:
-        """Compare two logical trees for equality."""
         if not isinstance(other, LogicalTree):
             return False
         return self.root == other.root
 
     def __hash__(self) -> int:
-        """Hash based on root node."""
         return hash(self.root)
 
     def __lt__(self, other: object) -> bool:
         if not isinstance(other, LogicalTree):
             return NotImplemented
         return self.root < other.root
+
+    def __repr__(self) -> str:
+        return f"LogicalTree({self.root!r})"
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls,
+        _source_type: Any,
+        _handler: GetCoreSchemaHandler,
+    ) -> core_schema.CoreSchema:
+        def validate_from_dict(value: dict[str, Any]) -> LogicalTree:
+            """Validate from dict"""
+            try:
+                return cls(root=_node_from_dict(value["root"]))
+            except (KeyError, TypeError) as e:
+                raise ValueError(f"Invalid logical tree: {e}") from None
+
+        def serialize_to_dict(instance: LogicalTree) -> dict[str, Any]:
+            """Serialize to dict"""
+            return {"root": _node_to_dict(instance.root)}
+
+        from_dict_schema = core_schema.chain_schema(
+            [
+                core_schema.dict_schema(),
+                core_schema.no_info_plain_validator_function(validate_from_dict),
+            ]
+        )
+        return core_schema.json_or_python_schema(
+            json_schema=from_dict_schema,
+            python_schema=core_schema.union_schema(
+                [core_schema.is_instance_schema(cls), from_dict_schema]
+            ),
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                serialize_to_dict
+            ),
+        )
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+class RuleMatch(BaseModel):
+    source: str
+    rule_type: str
+    rule: str
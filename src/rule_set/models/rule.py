@@ -5,7 +5,7 @@ from pydantic import BaseModel, Field
 
 from .aho import Aho
 from .enum import DomainType
-from .logical import LogicalTree
+from .logical import ConcreteRule, LogicalTree, RuleType, canonicalize, is_covered
 from .option import Option
 from .trie import DomainTrie, IPTrie, IPTrie6
 
@@ -36,6 +36,11 @@ class RuleModel(BaseModel):
     domain_keyword: list[str] | set[str] = set()
     url_regex: list[str] | set[str] = set()
 
+    def normalize(self) -> None:
+        """Settle lazily built state, so that sharing the model is read-only"""
+        self.ip_trie.normalize()
+        self.ip_trie6.normalize()
+
     def merge_with(self, other: Self) -> None:
         self.domain_trie.merge(other.domain_trie)
         self.domain_keyword.update(other.domain_keyword)
@@ -92,6 +97,71 @@ class RuleModel(BaseModel):
                 if is_matched:
                     self.domain_trie.remove(domain, domain_type)
                     logger.error(f"{domain_type},{domain} -> DOMAIN-KEYWORD,{keyword}")
+        self.logical = canonicalize(self.logical)
+        self._drop_covered_logical(option.serialization.no_resolve)
+
+    def _drop_covered_logical(self, no_resolve: bool):
+        """
+        Drop logical rules matching nothing the plain rules do not match already.
+
+        Plain IP and ASN rules are written with no-resolve when no_resolve is
+        set, and then no longer match hostnames resolving into them. IP and
+        ASN rules of a logical rule only count as covered if they do not
+        resolve either, or if the plain rules do.
+        """
+        if not self.logical:
+            return
+        aho = Aho(list(self.domain_keyword)) if self.domain_keyword else None
+        domain_types = {
+            RuleType.DOMAIN: DomainType.DOMAIN,
+            RuleType.DOMAIN_SUFFIX: DomainType.DOMAIN_SUFFIX,
+            RuleType.DOMAIN_WILDCARD: DomainType.DOMAIN_WILDCARD,
+        }
+        ip_tries = {RuleType.IP_CIDR: self.ip_trie, RuleType.IP_CIDR6: self.ip_trie6}
+        ip_rule_types = {RuleType.IP_CIDR, RuleType.IP_CIDR6, RuleType.IP_ASN}
+        value_sets = {
+            RuleType.IP_ASN: self.ip_asn,
+            RuleType.PROCESS_NAME: self.process,
+            RuleType.USER_AGENT: self.user_agent,
+        }
+
+        def resolves(rule: ConcreteRule) -> bool:
+            return not any(
+                value.lower() == "no-resolve" for value in rule.rule_values[1:]
+            )
+
+        def rule_is_covered(rule: ConcreteRule) -> bool:
+            # Any further values are options such as no-resolve
+            value = rule.rule_values[0] if rule.rule_values else ""
+            if (domain_type := domain_types.get(rule.rule_type)) is not None:
+                if self.domain_trie.covers(value, domain_type):
+                    return True
+                return (
+                    aho is not None
+                    and domain_type != DomainType.DOMAIN_WILDCARD
+                    and aho.matched(value)[0]
+                )
+            if rule.rule_type == RuleType.DOMAIN_KEYWORD:
+                return aho is not None and aho.matched(value)[0]
+            if rule.rule_type in ip_rule_types and no_resolve and resolves(rule):
+                return False
+            if (ip_trie := ip_tries.get(rule.rule_type)) is not None:
+                try:
+                    return ip_trie.covers(value)
+                except ValueError:
+                    return False
+            if (values := value_sets.get(rule.rule_type)) is not None:
+                return value in values
+            return False
+
+        memo = {}
+        kept = set()
+        for tree in self.logical:
+            if is_covered(tree.root, rule_is_covered, memo):
+                logger.error(f"{tree!r} -> covered by plain rules")
+            else:
+                kept.add(tree)
+        self.logical = kept
 
     def sort(self):
         for key in RuleModel.model_fields.keys():
@@ -138,3 +208,6 @@ class V2rayDomainInclude(BaseModel):
 class V2rayDomainResult(BaseModel):
     rules: RuleModel = RuleModel()
     includes: list[V2rayDomainInclude] = []
+
+    def normalize(self) -> None:
+        self.rules.normalize()
@@ -0,0 +1,205 @@
+"""
+Compact binary snapshots of RuleModel for the resource and source caches.
+
+Layout (arrays use native byte order, snapshots never leave the local cache):
+    magic, version, kind
+    string table: every domain label and plain rule string stored once,
+        as their lengths in code points followed by their UTF-8 text
+    domain trie: per DomainType, label counts and label ids of the
+        reversed domains, already sorted and free of covered entries
+    ip tries: packed network addresses and prefix lengths
+    string collections: ids into the string table
+    logical rules and v2ray includes: JSON
+"""
+
+import struct
+from array import array
+from collections.abc import Iterable
+from itertools import accumulate, pairwise
+
+from pydantic import TypeAdapter
+
+from .enum import DomainType
+from .logical import LogicalTree
+from .rule import RuleModel, V2rayDomainInclude, V2rayDomainResult
+from .trie import DomainTrie, IPTrie, IPTrie6
+
+MAGIC = b"RSNP"
+VERSION = 2
+KIND_RULES = 0
+KIND_V2RAY_DOMAIN = 1
+
+STRING_FIELDS = ["ip_asn", "process", "user_agent", "domain_keyword", "url_regex"]
+
+_header = struct.Struct("<4sBB")
+_u32 = struct.Struct("<I")
+
+_logical_adapter = TypeAdapter(list[LogicalTree])
+_includes_adapter = TypeAdapter(list[V2rayDomainInclude])
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self.strings: dict[str, int] = {}
+        self.chunks: list[bytes] = []
+
+    def intern(self, value: str) -> int:
+        if (string_id := self.strings.get(value)) is None:
+            string_id = self.strings[value] = len(self.strings)
+        return string_id
+
+    def u32(self, value: int) -> None:
+        self.chunks.append(_u32.pack(value))
+
+    def blob(self, value: bytes) -> None:
+        self.u32(len(value))
+        self.chunks.append(value)
+
+    def ids(self, values: Iterable[str]) -> None:
+        ids = array("I", (self.intern(value) for value in values))
+        self.u32(len(ids))
+        self.chunks.append(ids.tobytes())
+
+    def getvalue(self, kind: int) -> bytes:
+        # Lengths rather than a separator, rule strings may contain anything
+        lengths = array("I", map(len, self.strings))
+        table = "".join(self.strings).encode()
+        return b"".join(
+            [
+                _header.pack(MAGIC, VERSION, kind),
+                _u32.pack(len(lengths)),
+                lengths.tobytes(),
+                _u32.pack(len(table)),
+                table,
+                *self.chunks,
+            ]
+        )
+
+
+class _Reader:
+    def __init__(self, data: bytes) -> None:
+        self.view = memoryview(data)
+        magic, version, self.kind = _header.unpack_from(self.view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a rule snapshot or unsupported snapshot version")
+        self.offset = _header.size
+        lengths = self.array("I", self.u32())
+        # Decoded once, lengths count code points so the text slices directly
+        table = str(self.take(self.u32()), "utf-8")
+        if sum(lengths) != len(table):
+            raise ValueError("Corrupt snapshot string table")
+        offsets = pairwise(accumulate(lengths, initial=0))
+        self.strings = [table[start:end] for start, end in offsets]
+
+    def u32(self) -> int:
+        (value,) = _u32.unpack_from(self.view, self.offset)
+        self.offset += _u32.size
+        return value
+
+    def take(self, size: int) -> memoryview:
+        if self.offset + size > len(self.view):
+            raise ValueError("Truncated snapshot")
+        chunk = self.view[self.offset : self.offset + size]
+        self.offset += size
+        return chunk
+
+    def blob(self) -> bytes:
+        return bytes(self.take(self.u32()))
+
+    def array(self, typecode: str, count: int) -> array:
+        values = array(typecode)
+        values.frombytes(self.take(count * values.itemsize))
+        return values
+
+    def ids(self) -> list[str]:
+        strings = self.strings
+        return [strings[i] for i in self.array("I", self.u32())]
+
+
+def _dump_rules(writer: _Writer, rules: RuleModel) -> None:
+    by_type: dict[DomainType, list[tuple[str, ...]]] = {dt: [] for dt in DomainType}
+    for parts, domain_type in rules.domain_trie.sorted_iterparts():
+        by_type[domain_type].append(parts)
+    for domain_type in DomainType:
+        domains = by_type[domain_type]
+        writer.u32(len(domains))
+        writer.chunks.append(array("H", map(len, domains)).tobytes())
+        writer.ids(label for parts in domains for label in parts)
+
+    for ip_trie in (rules.ip_trie, rules.ip_trie6):
+        networks = list(ip_trie.iterpacked())
+        writer.u32(len(networks))
+        writer.chunks.append(b"".join(address for address, _ in networks))
+        writer.chunks.append(bytes(prefix for _, prefix in networks))
+
+    for field in STRING_FIELDS:
+        values = getattr(rules, field)
+        writer.u32(isinstance(values, list))
+        writer.ids(values)
+
+    writer.u32(isinstance(rules.logical, list))
+    writer.blob(_logical_adapter.dump_json(list(rules.logical)))
+
+
+def _load_rules(reader: _Reader) -> RuleModel:
+    domain_items = []
+    for domain_type in DomainType:
+        lengths = reader.array("H", reader.u32())
+        labels = reader.ids()
+        start = 0
+        for length in lengths:
+            domain_items.append((tuple(labels[start : start + length]), domain_type))
+            start += length
+
+    ip_tries = []
+    for ip_trie_cls, address_size in ((IPTrie, 4), (IPTrie6, 16)):
+        count = reader.u32()
+        addresses = reader.take(count * address_size)
+        prefixes = reader.take(count)
+        networks = (
+            (bytes(addresses[i * address_size : (i + 1) * address_size]), prefixes[i])
+            for i in range(count)
+        )
+        ip_tries.append(ip_trie_cls.from_packed(networks))
+
+    values = {}
+    for field in STRING_FIELDS:
+        is_list = reader.u32()
+        strings = reader.ids()
+        values[field] = strings if is_list else set(strings)
+
+    is_list = reader.u32()
+    logical = _logical_adapter.validate_json(reader.blob())
+
+    # Build through model_construct: every value is already validated.
+    return RuleModel.model_construct(
+        domain_trie=DomainTrie.from_parts(domain_items),
+        ip_trie=ip_tries[0],
+        ip_trie6=ip_tries[1],
+        logical=logical if is_list else set(logical),
+        **values,
+    )
+
+
+def dumps(value: RuleModel | V2rayDomainResult) -> bytes:
+    """Serialize parsed rules into a binary snapshot"""
+    writer = _Writer()
+    if isinstance(value, V2rayDomainResult):
+        _dump_rules(writer, value.rules)
+        writer.blob(_includes_adapter.dump_json(value.includes))
+        return writer.getvalue(KIND_V2RAY_DOMAIN)
+    _dump_rules(writer, value)
+    return writer.getvalue(KIND_RULES)
+
+
+def loads(data: bytes) -> RuleModel | V2rayDomainResult:
+    """Load a binary snapshot, raising ValueError if data is not a valid one"""
+    try:
+        reader = _Reader(data)
+        rules = _load_rules(reader)
+        if reader.kind == KIND_V2RAY_DOMAIN:
+            includes = _includes_adapter.validate_json(reader.blob())
+            return V2rayDomainResult.model_construct(rules=rules, includes=includes)
+        return rules
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Corrupt snapshot: {e}") from e
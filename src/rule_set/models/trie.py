@@ -1,29 +1,86 @@
-from collections.abc import Iterator
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator, Sequence
+from operator import itemgetter
+from socket import AF_INET, AF_INET6, inet_ntop, inet_pton
+from sys import intern
 from typing import Any, Self
 
 from pydantic import GetCoreSchemaHandler
 from pydantic_core import core_schema
-from pygtrie import Trie
-from pytricia import PyTricia
 
 from .enum import DomainType
 
 
+class _Node:
+    """
+    Inner trie node.
+
+    A label that ends a domain with nothing below it is stored in its parent
+    as a bare DomainType, so only labels with children cost a node object. A
+    single child is kept in the label / entry slots and a dict is only
+    allocated once a node has several children.
+    """
+
+    __slots__ = ("children", "entry", "label", "value")
+
+    def __init__(self, value: DomainType | None = None) -> None:
+        self.value = value
+        self.label: str | None = None
+        self.entry: _Node | DomainType | None = None
+        self.children: dict[str, _Node | DomainType] | None = None
+
+    def get(self, label: str) -> "_Node | DomainType | None":
+        if self.children is not None:
+            return self.children.get(label)
+        if self.label == label:
+            return self.entry
+        return None
+
+    def put(self, label: str, entry: "_Node | DomainType") -> None:
+        if self.children is not None:
+            self.children[label] = entry
+        elif self.label is None or self.label == label:
+            self.label, self.entry = label, entry
+        else:
+            self.children = {self.label: self.entry, label: entry}
+            self.label = self.entry = None
+
+    def pop(self, label: str) -> None:
+        if self.children is not None:
+            del self.children[label]
+            if len(self.children) == 1:
+                ((self.label, self.entry),) = self.children.items()
+                self.children = None
+        elif self.label == label:
+            self.label = self.entry = None
+
+    def items(self) -> Iterable[tuple[str, "_Node | DomainType"]]:
+        if self.children is not None:
+            return self.children.items()
+        if self.label is None:
+            return ()
+        return ((self.label, self.entry),)
+
+    def has_children(self) -> bool:
+        return self.children is not None or self.label is not None
+
+
 class DomainTrie:
     def __init__(self):
-        self._trie = Trie()
+        self._root = _Node()
+        self._sorting = False
 
+    @staticmethod
     def _domain_to_reversed_parts(
-        self, domain: str, domain_type: DomainType
+        domain: str, domain_type: DomainType
     ) -> tuple[str, ...]:
         sep = "." if domain_type != DomainType.DOMAIN_REGEX else r"\."
         if domain_type == DomainType.DOMAIN_REGEX:
             domain = domain.rstrip("$")
         return tuple(domain.split(sep)[::-1])
 
-    def _reversed_parts_to_domain(
-        self, parts: tuple[str, ...], domain_type: DomainType
-    ) -> str:
+    @staticmethod
+    def _reversed_parts_to_domain(parts: Sequence[str], domain_type: DomainType) -> str:
         sep = "." if domain_type != DomainType.DOMAIN_REGEX else r"\."
         domain = sep.join(parts[::-1])
         if domain_type == DomainType.DOMAIN_REGEX:
@@ -31,57 +88,298 @@ class DomainTrie:
         return domain
 
     def add(self, domain: str, domain_type: DomainType):
-        parts = self._domain_to_reversed_parts(domain, domain_type)
-        # Check if already covered by parent suffix or self is already a suffix
-        for _, dt in self._trie.prefixes(parts):
-            if dt == DomainType.DOMAIN_SUFFIX:
-                return
-        self._trie[parts] = domain_type
-        if domain_type != DomainType.DOMAIN_SUFFIX:
-            return
-        # Clear children if suffix
-        for d in self._trie.keys(prefix=parts):
-            if d == parts:
+        self._add_parts(
+            self._domain_to_reversed_parts(domain, domain_type), domain_type
+        )
+
+    def _add_parts(self, parts: tuple[str, ...], domain_type: DomainType):
+        node = self._root
+        last = len(parts) - 1
+        for depth, label in enumerate(parts):
+            child = node.get(label)
+            if child is None:
+                label = intern(label)
+                if depth == last:
+                    node.put(label, domain_type)
+                    return
+                child = _Node()
+                node.put(label, child)
+            elif type(child) is _Node:
+                # Check if already covered by parent suffix or self is already a suffix
+                if child.value == DomainType.DOMAIN_SUFFIX:
+                    return
+                if depth == last:
+                    if domain_type == DomainType.DOMAIN_SUFFIX:
+                        # Clear children if suffix
+                        node.put(label, domain_type)
+                    else:
+                        child.value = domain_type
+                    return
+            else:
+                if child == DomainType.DOMAIN_SUFFIX:
+                    return
+                if depth == last:
+                    node.put(label, domain_type)
+                    return
+                child = _Node(child)
+                node.put(label, child)
+            node = child
+
+    def _set_all(self, items: Iterable[tuple[tuple[str, ...], DomainType]]):
+        """
+        Store keys as is, without any suffix coverage checks.
+
+        The path of the previous key is kept, so sorted input only walks the
+        labels that differ from the key before it.
+        """
+        path = [self._root]
+        previous: tuple[str, ...] = ()
+        for parts, domain_type in items:
+            depth = 0
+            shared = min(len(path), len(parts)) - 1
+            while depth < shared and parts[depth] == previous[depth]:
+                depth += 1
+            del path[depth + 1 :]
+            node = path[-1]
+            # Below a node created for this key every label is new as well
+            fresh = False
+            for label in parts[depth:-1]:
+                child = None if fresh else node.get(label)
+                if child is None:
+                    child = _Node()
+                    if fresh:
+                        node.label, node.entry = intern(label), child
+                    else:
+                        node.put(intern(label), child)
+                        fresh = True
+                elif type(child) is not _Node:
+                    child = _Node(child)
+                    node.put(label, child)
+                path.append(child)
+                node = child
+            label = parts[-1]
+            if fresh:
+                node.label, node.entry = intern(label), domain_type
+                previous = parts
                 continue
-            del self._trie[d]
+            child = node.get(label)
+            if type(child) is _Node:
+                child.value = domain_type
+            else:
+                node.put(intern(label), domain_type)
+            previous = parts
+
+    def _find_path(self, parts: tuple[str, ...]) -> list[_Node] | None:
+        """Return the nodes from the root down to the parent of parts"""
+        path = [self._root]
+        for label in parts[:-1]:
+            child = path[-1].get(label)
+            if type(child) is not _Node:
+                return None
+            path.append(child)
+        if path[-1].get(parts[-1]) is None:
+            return None
+        return path
+
+    @staticmethod
+    def _prune(path: list[_Node], parts: tuple[str, ...]):
+        """Drop or collapse ancestors left without children after a removal"""
+        for depth in range(len(path) - 1, 0, -1):
+            node = path[depth]
+            if node.has_children():
+                return
+            parent = path[depth - 1]
+            if node.value is None:
+                parent.pop(parts[depth - 1])
+            else:
+                parent.put(parts[depth - 1], node.value)
+                return
 
     def remove(self, domain: str, domain_type: DomainType):
         parts = self._domain_to_reversed_parts(domain, domain_type)
-        self._trie.pop(parts, None)
+        if (path := self._find_path(parts)) is None:
+            return
+        parent = path[-1]
+        child = parent.get(parts[-1])
+        if type(child) is _Node:
+            if child.value is None:
+                return
+            child.value = None
+            if child.has_children():
+                return
+        parent.pop(parts[-1])
+        self._prune(path, parts)
 
     def filter_by_domain(self, domain: str):
-        try:
-            parts = self._domain_to_reversed_parts(domain, DomainType.DOMAIN_SUFFIX)
-            for d in self._trie.keys(prefix=parts):
-                del self._trie[d]
-        except KeyError:
-            pass
+        parts = self._domain_to_reversed_parts(domain, DomainType.DOMAIN_SUFFIX)
+        if (path := self._find_path(parts)) is None:
+            return
+        path[-1].pop(parts[-1])
+        self._prune(path, parts)
+
+    def covers(self, domain: str, domain_type: DomainType) -> bool:
+        """Whether every name the key matches is matched by the trie already"""
+        parts = self._domain_to_reversed_parts(domain, domain_type)
+        node = self._root
+        last = len(parts) - 1
+        for depth, label in enumerate(parts):
+            entry = node.get(label)
+            if entry is None:
+                return False
+            value = entry.value if type(entry) is _Node else entry
+            if depth == last:
+                return value == domain_type or (
+                    value == DomainType.DOMAIN_SUFFIX
+                    and domain_type in (DomainType.DOMAIN, DomainType.DOMAIN_SUFFIX)
+                )
+            if value == DomainType.DOMAIN_SUFFIX:
+                return True
+            if type(entry) is not _Node:
+                return False
+            node = entry
+        return False
 
     def merge(self, other: Self):
-        for d, dt in other.iteritems():
-            self.add(d, dt)
+        self._merge_nodes(self._root, other._root)
+
+    @classmethod
+    def _merge_nodes(cls, node: _Node, other: _Node):
+        """
+        Merge the children of other into node by walking both tries at once.
+
+        The result matches adding every key of other in iteration order: a
+        suffix on either side covers everything below it, and otherwise the
+        type from other wins.
+        """
+        for label, other_entry in other.items():
+            entry = node.get(label)
+            if entry is None:
+                node.put(label, cls._copy(other_entry))
+                continue
+            if (entry.value if type(entry) is _Node else entry) == (
+                DomainType.DOMAIN_SUFFIX
+            ):
+                continue
+            if type(other_entry) is not _Node:
+                if other_entry == DomainType.DOMAIN_SUFFIX or type(entry) is not _Node:
+                    node.put(label, other_entry)
+                else:
+                    entry.value = other_entry
+                continue
+            if other_entry.value == DomainType.DOMAIN_SUFFIX:
+                node.put(label, DomainType.DOMAIN_SUFFIX)
+                continue
+            if type(entry) is not _Node:
+                entry = _Node(entry)
+                node.put(label, entry)
+            if other_entry.value is not None:
+                entry.value = other_entry.value
+            cls._merge_nodes(entry, other_entry)
+
+    @classmethod
+    def _copy(cls, entry: _Node | DomainType) -> _Node | DomainType:
+        if type(entry) is not _Node:
+            return entry
+        copy = _Node(entry.value)
+        if entry.children is not None:
+            copy.children = {
+                label: cls._copy(child) for label, child in entry.children.items()
+            }
+        elif entry.label is not None:
+            copy.label, copy.entry = entry.label, cls._copy(entry.entry)
+        return copy
+
+    @staticmethod
+    def _children(node: _Node, sort: bool) -> Iterator[tuple[str, _Node | DomainType]]:
+        children = node.children
+        if children is None:
+            if node.label is None:
+                return iter(())
+            return iter(((node.label, node.entry),))
+        if not sort:
+            return iter(children.items())
+        # Labels are unique, sorting them alone orders the entries too
+        labels = sorted(children)
+        return zip(labels, map(children.__getitem__, labels), strict=True)
+
+    def _walk(self, sort: bool) -> Iterator[tuple[list[str], DomainType]]:
+        """
+        Depth-first walk yielding every key before the keys below it.
+
+        Keys come as one shared list of reversed labels, which the walk
+        extends and shrinks in place: callers must copy it before the walk
+        moves on.
+        """
+        parts: list[str] = []
+        if self._root.value is not None:
+            yield parts, self._root.value
+        stack = [self._children(self._root, sort)]
+        while stack:
+            for label, entry in stack[-1]:
+                parts.append(label)
+                if type(entry) is not _Node:
+                    yield parts, entry
+                    parts.pop()
+                    continue
+                if entry.value is not None:
+                    yield parts, entry.value
+                # Descend, the iterator of this node resumes once it is done
+                stack.append(self._children(entry, sort))
+                break
+            else:
+                stack.pop()
+                if parts:
+                    parts.pop()
+
+    def _iterparts(self, sort: bool) -> Iterator[tuple[tuple[str, ...], DomainType]]:
+        for parts, domain_type in self._walk(sort):
+            yield tuple(parts), domain_type
+
+    def _iterdomains(self, sort: bool) -> Iterator[tuple[str, DomainType]]:
+        for parts, domain_type in self._walk(sort):
+            if domain_type == DomainType.DOMAIN_REGEX:
+                yield self._reversed_parts_to_domain(parts, domain_type), domain_type
+            else:
+                yield ".".join(reversed(parts)), domain_type
 
     def iteritems(self) -> Iterator[tuple[str, DomainType]]:
-        for d, dt in self._trie.iteritems():
-            d = self._reversed_parts_to_domain(d, dt)
-            yield d, dt
+        return self._iterdomains(self._sorting)
 
     def items(self) -> list[tuple[str, DomainType]]:
         return list(self.iteritems())
 
+    def sorted_iterparts(self) -> Iterator[tuple[tuple[str, ...], DomainType]]:
+        """Iterate raw reversed-label keys in sorted order"""
+        return self._iterparts(True)
+
+    @classmethod
+    def from_parts(cls, items: Iterable[tuple[tuple[str, ...], DomainType]]) -> Self:
+        """Bulk build from keys taken from another trie, skipping coverage checks"""
+        trie = cls()
+        trie._set_all(items)
+        return trie
+
+    @classmethod
+    def from_items(cls, items: Iterable[tuple[str, DomainType]]) -> Self:
+        """Bulk build, equivalent to calling add() for every item in order"""
+        trie = cls()
+        add_parts = trie._add_parts
+        to_parts = cls._domain_to_reversed_parts
+        for domain, domain_type in items:
+            add_parts(to_parts(domain, domain_type), domain_type)
+        return trie
+
     def sorted_iteritems(self) -> Iterator[tuple[str, DomainType]]:
-        self.enable_sorting(True)
-        yield from self.iteritems()
-        self.enable_sorting(False)
+        return self._iterdomains(True)
 
     def __repr__(self) -> str:
         return ", ".join(f"<'{d}' - {dt}>" for d, dt in self.iteritems())
 
     def __len__(self) -> int:
-        return len(self._trie)
+        return sum(1 for _ in self._walk(False))
 
     def enable_sorting(self, enable: bool = True):
-        self._trie.enable_sorting(enable)
+        self._sorting = enable
 
     @classmethod
     def __get_pydantic_core_schema__(
@@ -91,11 +389,11 @@ class DomainTrie:
     ) -> core_schema.CoreSchema:
         def validate_from_dict(value: dict[DomainType, list[str]]) -> Self:
             """Validate from dict"""
-            trie = cls()
-            for domain_type, domains in value.items():
-                for domain in domains:
-                    trie.add(domain, domain_type)
-            return trie
+            return cls.from_items(
+                (domain, domain_type)
+                for domain_type, domains in value.items()
+                for domain in domains
+            )
 
         def serialize_to_dict(instance: Self) -> dict[DomainType, list[str]]:
             """Serialize to dict"""
@@ -128,22 +426,176 @@ class DomainTrie:
 
 
 class IPTrie:
+    """
+    Set of IPv4 networks kept as sorted, disjoint address ranges.
+
+    Added networks are buffered and folded into the ranges on the next read,
+    which merges nested, overlapping and adjacent networks alike. Reads
+    therefore yield the minimal CIDR cover of the set, e.g. two sibling /25s
+    come out as one /24.
+    """
+
+    _family = AF_INET
+    _bits = 32
+
     def __init__(self):
-        self._trie = PyTricia()
+        # Half-open [start, end) ranges as parallel start / end lists
+        self._ranges: tuple[list[int], list[int]] = ([], [])
+        self._pending: list[tuple[int, int]] = []
+
+    @classmethod
+    def _to_range(cls, ip: str) -> tuple[int, int]:
+        address, _, prefix = ip.partition("/")
+        try:
+            value = int.from_bytes(inet_pton(cls._family, address.strip()))
+            prefixlen = int(prefix) if prefix else cls._bits
+        except (OSError, ValueError):
+            raise ValueError(f"Invalid network: '{ip}'") from None
+        if not 0 <= prefixlen <= cls._bits:
+            raise ValueError(f"Invalid network: '{ip}'")
+        size = 1 << (cls._bits - prefixlen)
+        start = value & -size
+        return start, start + size
+
+    def _normalized(self) -> tuple[list[int], list[int]]:
+        pending = self._pending
+        if not pending:
+            return self._ranges
+        ranges = list(zip(*self._ranges, strict=True))
+        ranges.extend(pending)
+        # Ends need no ordering, the sweep below keeps the furthest one
+        ranges.sort(key=itemgetter(0))
+        starts: list[int] = []
+        ends: list[int] = []
+        current_start = current_end = -1
+        for start, end in ranges:
+            if start <= current_end:
+                if end > current_end:
+                    current_end = end
+            else:
+                if current_end >= 0:
+                    starts.append(current_start)
+                    ends.append(current_end)
+                current_start, current_end = start, end
+        if current_end >= 0:
+            starts.append(current_start)
+            ends.append(current_end)
+        # Publish the ranges before dropping the buffer: a concurrent reader of
+        # a shared trie then at worst folds the same networks in again.
+        self._ranges = (starts, ends)
+        self._pending = []
+        return self._ranges
+
+    @classmethod
+    def _from_normalized(cls, starts: list[int], ends: list[int]) -> Self:
+        trie = cls()
+        trie._ranges = (starts, ends)
+        return trie
 
     def add(self, ip: str):
-        if self._trie.get_key(ip):
-            return
-        self._trie[ip] = None
-        for prefix in self._trie.children(ip):
-            del self._trie[prefix]
+        self._pending.append(self._to_range(ip))
 
-    def iteritems(self) -> Iterator[str]:
-        yield from self._trie
+    def normalize(self) -> None:
+        """Fold buffered networks in now, so that later reads write nothing"""
+        self._normalized()
+
+    def covers(self, ip: str) -> bool:
+        """Whether the network lies entirely within the set"""
+        start, end = self._to_range(ip)
+        starts, ends = self._normalized()
+        i = bisect_right(starts, start) - 1
+        return i >= 0 and ends[i] >= end
 
     def merge(self, other: Self):
-        for ip in other.iteritems():
-            self.add(ip)
+        self._pending.extend(other.iterranges())
+
+    def union(self, other: Self) -> Self:
+        trie = self.from_ranges(self.iterranges())
+        trie.merge(other)
+        return trie
+
+    def intersection(self, other: Self) -> Self:
+        starts, ends = self._normalized()
+        other_starts, other_ends = other._normalized()
+        result_starts: list[int] = []
+        result_ends: list[int] = []
+        i = j = 0
+        while i < len(starts) and j < len(other_starts):
+            start = max(starts[i], other_starts[j])
+            end = min(ends[i], other_ends[j])
+            if start < end:
+                result_starts.append(start)
+                result_ends.append(end)
+            if ends[i] < other_ends[j]:
+                i += 1
+            else:
+                j += 1
+        return self._from_normalized(result_starts, result_ends)
+
+    def difference(self, other: Self) -> Self:
+        other_starts, other_ends = other._normalized()
+        result_starts: list[int] = []
+        result_ends: list[int] = []
+        j = 0
+        for start, end in zip(*self._normalized(), strict=True):
+            while j < len(other_starts) and other_ends[j] <= start:
+                j += 1
+            k = j
+            while k < len(other_starts) and other_starts[k] < end:
+                if other_starts[k] > start:
+                    result_starts.append(start)
+                    result_ends.append(other_starts[k])
+                start = max(start, other_ends[k])
+                k += 1
+            if start < end:
+                result_starts.append(start)
+                result_ends.append(end)
+            # The last range removed may reach into the next range as well
+            j = max(j, k - 1)
+        return self._from_normalized(result_starts, result_ends)
+
+    def iterranges(self) -> Iterator[tuple[int, int]]:
+        """Iterate the set as sorted, disjoint [start, end) integer ranges"""
+        return zip(*self._normalized(), strict=True)
+
+    @classmethod
+    def from_ranges(cls, items: Iterable[tuple[int, int]]) -> Self:
+        trie = cls()
+        trie._pending.extend(items)
+        return trie
+
+    def itercidrs(self) -> Iterator[tuple[int, int]]:
+        """Iterate the minimal CIDR cover as (network address, prefix length)"""
+        bits = self._bits
+        for start, end in self.iterranges():
+            while start < end:
+                # Largest block aligned at start that still fits in the range
+                size = min(
+                    start & -start or 1 << bits, 1 << (end - start).bit_length() - 1
+                )
+                yield start, bits + 1 - size.bit_length()
+                start += size
+
+    def iteritems(self) -> Iterator[str]:
+        family, size = self._family, self._bits // 8
+        for address, prefixlen in self.itercidrs():
+            yield f"{inet_ntop(family, address.to_bytes(size))}/{prefixlen}"
+
+    def iterpacked(self) -> Iterator[tuple[bytes, int]]:
+        """Iterate the minimal CIDR cover as (packed address, prefix length)"""
+        size = self._bits // 8
+        for address, prefixlen in self.itercidrs():
+            yield address.to_bytes(size), prefixlen
+
+    @classmethod
+    def from_packed(cls, items: Iterable[tuple[bytes, int]]) -> Self:
+        """Bulk build from networks taken from another trie"""
+        bits = cls._bits
+        trie = cls()
+        for address, prefixlen in items:
+            start = int.from_bytes(address)
+            trie._pending.append((start, start + (1 << bits - prefixlen)))
+        return trie
 
     def __repr__(self) -> str:
         return ", ".join(ip for ip in self.iteritems())
@@ -184,5 +636,5 @@ class IPTrie:
 
 
 class IPTrie6(IPTrie):
-    def __init__(self):
-        self._trie = PyTricia(128)
+    _family = AF_INET6
+    _bits = 128
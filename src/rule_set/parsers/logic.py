@@ -13,100 +13,109 @@ from rule_set.models.logical import (
     OrNode,
     RuleNode,
     RuleType,
+    intern_node,
 )
 
-parentheses_re = re.compile(r"^\((.*)\)$")
+# Every token is a parenthesis, a comma or the text between them
+token_re = re.compile(r"[(),]|[^(),]+")
 
 
-def split_outside_parentheses(s: str) -> list[str]:
-    result = []
-    current = []
-    level = 0
+class _Parser:
+    """
+    Recursive-descent parser over the tokens of one logical rule.
 
-    for char in s:
-        if char == "," and level == 0:
-            result.append("".join(current))
-            current = []
-        else:
-            if char == "(":
-                level += 1
-            elif char == ")":
-                level -= 1
-            current.append(char)
+    The rule is tokenized once and each token is looked at once, however
+    deeply the rule nests:
 
-    result.append("".join(current))
-    return result
+        rule     := OPERATOR "," operands
+        operands := "(" item ("," item)* ")"
+        item     := "(" (OPERATOR "," operands | TYPE ("," VALUE)*) ")"
+    """
 
+    def __init__(self, rule: str) -> None:
+        self.tokens = token_re.findall(rule)
+        self.position = 0
 
-def remove_outer_parentheses(text: str) -> str:
-    match = parentheses_re.match(text)
-    if match:
-        return match.group(1)
-    return text
-
-
-def _parse_logical_node(
-    operator: LogicalOperator, expression: str
-) -> AndNode | OrNode | NotNode | RuleNode:
-    """Recursively parse logical expression into typed nodes."""
-    expression = remove_outer_parentheses(expression)
-    sub_expressions = split_outside_parentheses(expression)
-
-    if operator == LogicalOperator.NOT:
-        if len(sub_expressions) != 1:
-            raise ParserError("NOT rule must only have one sub-rule")
-
-        sub_expression = sub_expressions[0]
-        sub_expression = remove_outer_parentheses(sub_expression)
-        sub_parts = split_outside_parentheses(sub_expression)
+    def _peek(self) -> str | None:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
 
-        if sub_parts[0].upper() in LogicalOperator:
-            # Nested operator
-            sub_operator = LogicalOperator(sub_parts[0].upper())
-            child = _parse_logical_node(sub_operator, sub_parts[1])
-        else:
-            # Concrete rule
-            if len(sub_parts) < 2:
-                raise ParserError(f"Invalid rule format: {sub_expression}")
-            child = _create_rule_node(sub_parts[0], *sub_parts[1:])
-
-        return NotNode(child=child)
-
-    elif operator in (LogicalOperator.AND, LogicalOperator.OR):
-        if len(sub_expressions) < 2:
+    def _next(self) -> str:
+        token = self._peek()
+        if token is None:
+            raise ParserError("Unexpected end of rule")
+        self.position += 1
+        return token
+
+    def _expect(self, expected: str):
+        token = self._next()
+        if token != expected:
+            raise ParserError(f"Expected '{expected}' but found '{token}'")
+
+    def _word(self) -> str:
+        token = self._peek()
+        if token is None or token in "(),":
+            return ""
+        self.position += 1
+        return token
+
+    def parse(self) -> AndNode | OrNode | NotNode:
+        operator = LogicalOperator(self._word().upper())
+        self._expect(",")
+        root = self._operands(operator)
+        if self.position != len(self.tokens):
+            raise ParserError(f"Unexpected '{self._peek()}' after the rule")
+        return root
+
+    def _operands(self, operator: LogicalOperator) -> AndNode | OrNode | NotNode:
+        self._expect("(")
+        children = [self._item()]
+        while self._peek() == ",":
+            self.position += 1
+            children.append(self._item())
+        self._expect(")")
+
+        if operator == LogicalOperator.NOT:
+            if len(children) != 1:
+                raise ParserError("NOT rule must only have one sub-rule")
+            return intern_node(NotNode(child=children[0]))
+        if len(children) < 2:
             raise ParserError(
-                f"Invalid {operator} rule: expected at least two sub-rules but found {len(sub_expressions)}.\n"
-                f"Sub-rules:\n"
-                f"{', '.join(sub_expressions)}"
+                f"Invalid {operator} rule: expected at least two sub-rules but found {len(children)}."
             )
-
-        children = []
-        for sub_expression in sub_expressions:
-            sub_expression = remove_outer_parentheses(sub_expression)
-            sub_parts = split_outside_parentheses(sub_expression)
-            if sub_parts[0].upper() in LogicalOperator:
-                # Nested operator
-                sub_operator = LogicalOperator(sub_parts[0].upper())
-                child = _parse_logical_node(sub_operator, sub_parts[1])
-            else:
-                # Concrete rule
-                if len(sub_parts) < 2:
-                    raise ParserError(f"Invalid rule format: {sub_expression}")
-                child = _create_rule_node(sub_parts[0], *sub_parts[1:])
-
-            children.append(child)
-
         if operator == LogicalOperator.AND:
-            return AndNode(children=children)
-        else:
-            return OrNode(children=children)
+            return intern_node(AndNode(children=children))
+        return intern_node(OrNode(children=children))
+
+    def _item(self) -> AndNode | OrNode | NotNode | RuleNode:
+        start = self.position
+        self._expect("(")
+        head = self._word()
+        if head.upper() in LogicalOperator:
+            # Nested operator
+            self._expect(",")
+            node = self._operands(LogicalOperator(head.upper()))
+            self._expect(")")
+            return node
+        # Concrete rule
+        values = []
+        while self._peek() == ",":
+            self.position += 1
+            values.append(self._word())
+        if self._peek() != ")" or not values:
+            raise ParserError(
+                f"Invalid rule format: {''.join(self.tokens[start : self.position])}"
+            )
+        self.position += 1
+        return _create_rule_node(head, *values)
 
 
 def _create_rule_node(rule_type: str, *rule_values: str) -> RuleNode:
     """Create a rule node from type and values."""
     try:
         rule = ConcreteRule(rule_type=RuleType(rule_type), rule_values=rule_values)
-        return RuleNode(rule=rule)
+        return intern_node(RuleNode(rule=rule))
     except ValueError as e:
         raise ParserError(f"Invalid rule type '{rule_type}': {e}") from None
 
@@ -114,14 +123,8 @@ def _create_rule_node(rule_type: str, *rule_values: str) -> RuleNode:
 def parse(rule: str) -> LogicalTree | None:
     """Parse logical rule string into LogicalTree."""
     try:
-        rule = rule.replace(" ", "")
-        parent_expression, sub_expression = split_outside_parentheses(rule)
-
-        # Create root node based on operator
-        operator = LogicalOperator(parent_expression.upper())
-        root = _parse_logical_node(operator, sub_expression)
-
-        return LogicalTree(root=root)
+        rule = "".join(rule.split())
+        return LogicalTree(root=_Parser(rule).parse())
     except ParserError as e:
         logger.error(f"rule: '{rule}', err: {e}")
         return None
@@ -1,22 +1,181 @@
+"""
+Country extraction from MaxMind DB files.
+
+Rather than iterating every network through maxminddb, which decodes the
+record of each one, the search tree is walked directly. Country databases
+only hold a few hundred distinct records, so each data pointer is decoded
+once and its country code cached, and matching networks are collected as
+sorted integer ranges for the IP tries.
+"""
+
+import sys
+from array import array
+from concurrent.futures import Executor
 from pathlib import Path
 
 import maxminddb
+from maxminddb.decoder import Decoder
+from maxminddb.errors import InvalidDatabaseError
 
-from rule_set.models import RuleModel
+from rule_set.models import IPTrie, IPTrie6, RuleModel
 
+# The search tree and the data section are separated by 16 zero bytes
+DATA_SECTION_SEPARATOR_SIZE = 16
+IPV4_END = 1 << 32
 
-def parse(filepath: Path, country_code: str | None = None) -> RuleModel:
-    rules = RuleModel()
+_HIGH_NIBBLE = bytes(value >> 4 for value in range(256))
+_LOW_NIBBLE = bytes(value & 0xF for value in range(256))
+
+type Ranges = list[tuple[int, int]]
+
+
+def _read_records(
+    buffer: bytes, node_count: int, record_size: int
+) -> tuple[list[int], list[int]]:
+    """Decode the search tree into lists of left and right records"""
+    if record_size not in (24, 28, 32):
+        raise InvalidDatabaseError(f"Unknown record size: {record_size}")
+    tree_size = node_count * record_size // 4
+    if tree_size + DATA_SECTION_SEPARATOR_SIZE > len(buffer):
+        raise InvalidDatabaseError("The search tree extends past the end of the file")
+    tree = memoryview(buffer)[:tree_size]
+    # Widen every record to 32 bits with strided copies instead of a Python
+    # level loop over the nodes
+    padded = bytearray(node_count * 8)
+    if record_size == 32:
+        padded[:] = tree
+    elif record_size == 24:
+        for i in range(3):
+            padded[i + 1 :: 4] = tree[i::3]
+    else:
+        # The middle byte holds the high nibbles of both records
+        middle = bytes(tree[3::7])
+        padded[0::8] = middle.translate(_HIGH_NIBBLE)
+        padded[4::8] = middle.translate(_LOW_NIBBLE)
+        for i in range(3):
+            padded[i + 1 :: 8] = tree[i::7]
+            padded[i + 5 :: 8] = tree[i + 4 :: 7]
+    records = array("I")
+    records.frombytes(padded)
+    if sys.byteorder == "little":
+        records.byteswap()
+    return records[0::2].tolist(), records[1::2].tolist()
+
+
+def extract_ranges(
+    filepath: Path, country_code: str | None = None
+) -> tuple[Ranges, Ranges]:
+    """
+    Return the sorted IPv4 and IPv6 [start, end) ranges of every network with
+    data, or only of those whose country matches country_code.
+    """
     with maxminddb.open_database(filepath) as reader:
+        metadata = reader.metadata()
+    buffer = filepath.read_bytes()
+    node_count = metadata.node_count
+    search_tree_size = node_count * metadata.record_size // 4
+    lefts, rights = _read_records(buffer, node_count, metadata.record_size)
+    decoder = Decoder(buffer, search_tree_size + DATA_SECTION_SEPARATOR_SIZE)
+
+    def matches(pointer: int) -> bool:
         if country_code is None:
-            for ip, _ in reader:
-                ip_trie = rules.ip_trie if ip.version == 4 else rules.ip_trie6
-                ip_trie.add(str(ip))
+            return True
+        resolved = pointer - node_count + search_tree_size
+        if resolved >= len(buffer):
+            raise InvalidDatabaseError("The MaxMind DB file's search tree is corrupt")
+        record, _ = decoder.decode(resolved)
+        country = record.get("country") if isinstance(record, dict) else None
+        return isinstance(country, dict) and country.get("iso_code") == country_code
+
+    bits = 32
+    ipv4_start = 0
+    if metadata.ip_version == 6:
+        bits = 128
+        # IPv4 lives under ::/96, other subtrees may alias that node
+        for _ in range(96):
+            if ipv4_start >= node_count:
+                break
+            ipv4_start = lefts[ipv4_start]
+
+    # Whether a data pointer matches, records are shared by many networks
+    matched: dict[int, bool] = {}
+    networks: list[tuple[int, int]] = []
+    # Depth-first, left before right, so networks come out in address order.
+    # This loop visits every node, so both records are unrolled and leaves,
+    # about half of all records, never go through the stack.
+    stack = [(0, 0, 0)]
+    while stack:
+        node, depth, address = stack.pop()
+        depth += 1
+        address <<= 1
+        right = rights[node]
+        if right < node_count:
+            if right != ipv4_start:
+                stack.append((right, depth, address | 1))
+        elif right > node_count:
+            if (is_match := matched.get(right)) is None:
+                is_match = matched[right] = matches(right)
+            if is_match:
+                networks.append((address | 1, depth))
+        left = lefts[node]
+        if left < node_count:
+            if not (address and left == ipv4_start):
+                stack.append((left, depth, address))
+        elif left > node_count:
+            if (is_match := matched.get(left)) is None:
+                is_match = matched[left] = matches(left)
+            if is_match:
+                networks.append((address, depth))
+
+    ranges: Ranges = []
+    ranges6: Ranges = []
+    for address, depth in networks:
+        size = 1 << (bits - depth)
+        start = address * size
+        end = start + size
+        target = ranges if bits == 32 or end <= IPV4_END else ranges6
+        if target and target[-1][1] == start:
+            target[-1] = (target[-1][0], end)
         else:
-            for ip, info in reader:
-                if not info:
-                    continue
-                if info["country"]["iso_code"] == country_code:
-                    ip_trie = rules.ip_trie if ip.version == 4 else rules.ip_trie6
-                    ip_trie.add(str(ip))
+            target.append((start, end))
+    return ranges, ranges6
+
+
+def _pack(ranges: Ranges, size: int) -> bytes:
+    # Ends are stored inclusive so that the last IPv6 address still fits
+    return b"".join(
+        bound.to_bytes(size) for start, end in ranges for bound in (start, end - 1)
+    )
+
+
+def _unpack(data: bytes, size: int) -> Ranges:
+    bounds = [int.from_bytes(data[i : i + size]) for i in range(0, len(data), size)]
+    return [
+        (start, last + 1)
+        for start, last in zip(bounds[0::2], bounds[1::2], strict=True)
+    ]
+
+
+def extract_packed(
+    filepath: Path, country_code: str | None = None
+) -> tuple[bytes, bytes]:
+    """extract_ranges for worker processes, as packed big-endian range bounds"""
+    ranges, ranges6 = extract_ranges(filepath, country_code)
+    return _pack(ranges, 4), _pack(ranges6, 16)
+
+
+def parse(
+    filepath: Path, country_code: str | None = None, executor: Executor | None = None
+) -> RuleModel:
+    """Parse a MaxMind DB, walking its search tree on executor if given"""
+    if executor is None:
+        ranges, ranges6 = extract_ranges(filepath, country_code)
+    else:
+        packed, packed6 = executor.submit(
+            extract_packed, filepath, country_code
+        ).result()
+        ranges, ranges6 = _unpack(packed, 4), _unpack(packed6, 16)
+    rules = RuleModel()
+    rules.ip_trie = IPTrie.from_ranges(ranges)
+    rules.ip_trie6 = IPTrie6.from_ranges(ranges6)
     return rules
@@ -1,5 +1,8 @@
+import io
 import re
 from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
+from typing import IO
 
 from rule_set.models import RuleModel
 
@@ -8,27 +11,52 @@ comment_pattern = f"({'|'.join(COMMENT_PATTERNS)})"
 start_comment_pattern = re.compile(f"^({comment_pattern})")
 inline_comment_pattern = re.compile(comment_pattern)
 
+# Strings are split in chunks of about this many characters, so that only one
+# chunk worth of lines exists at a time
+LINE_CHUNK_SIZE = 1 << 16
+
+type ParserInput = str | bytes | Iterable[str] | IO[str] | IO[bytes]
+
+
+def iter_lines(data: ParserInput) -> Iterator[str]:
+    """Lazily split parser input into lines"""
+    if isinstance(data, str):
+        start = 0
+        while start < len(data):
+            # Chunks end right after a newline, so splitting them yields the
+            # same lines as splitting the whole string
+            end = data.find("\n", start + LINE_CHUNK_SIZE)
+            end = len(data) if end == -1 else end + 1
+            yield from data[start:end].splitlines()
+            start = end
+        return
+    if isinstance(data, bytes | bytearray):
+        data = io.BytesIO(data)
+    if isinstance(data, io.RawIOBase | io.BufferedIOBase):
+        data = io.TextIOWrapper(data, encoding="utf-8")
+    yield from data
+
+
+def strip_comments(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        # Most lines carry no comment at all, only they are worth a regex
+        if "#" in line or ";" in line or "//" in line:
+            if start_comment_pattern.search(line):
+                continue
+            line = inline_comment_pattern.split(line, maxsplit=1)[0].strip()
+        yield line
+
 
 class BaseParser(ABC):
     def __init__(
         self,
-        data: str | list[str],
+        data: ParserInput,
     ) -> None:
-        if isinstance(data, str):
-            data = data.splitlines()
-        self.data_lines = data
+        self.data_lines = strip_comments(iter_lines(data))
         self.result = RuleModel()
-        self.process()
-
-    def process(self):
-        processed_lines = []
-        for line in self.data_lines:
-            line = line.strip()
-            if not line or start_comment_pattern.search(line):
-                continue
-            line = inline_comment_pattern.split(line, maxsplit=1)[0].strip()
-            processed_lines.append(line)
-        self.data_lines = processed_lines
 
     @abstractmethod
     def parse(self) -> RuleModel: ...
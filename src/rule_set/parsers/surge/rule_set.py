@@ -1,48 +1,71 @@
 from loguru import logger
 
-from rule_set.models import DomainType, RuleModel
+from rule_set.models import DomainTrie, DomainType, RuleModel
 from rule_set.parsers import logic
-from rule_set.utils import is_logical_keyword, validate_domain
+from rule_set.utils import validate_domain
+from rule_set.utils.logical import LOGICAL_KEYWORDS
 
 from .base import BaseParser
 
+# Rule types going into the domain trie, wildcards are not validated
+DOMAIN_RULE_TYPES = {
+    "domain": DomainType.DOMAIN,
+    "domain-suffix": DomainType.DOMAIN_SUFFIX,
+    "domain-wildcard": DomainType.DOMAIN_WILDCARD,
+}
+# RuleModel set filled by each remaining plain rule type
+SET_RULE_TYPES = {
+    "domain-keyword": "domain_keyword",
+    "ip-asn": "ip_asn",
+    "user-agent": "user_agent",
+    "process-name": "process",
+    "url-regex": "url_regex",
+}
+IP_RULE_TYPES = {
+    "ip-cidr": "ip_trie",
+    "ip-cidr6": "ip_trie6",
+}
+LOGICAL_RULE_TYPES = frozenset(keyword.lower() for keyword in LOGICAL_KEYWORDS)
+
 
 class RuleSetParser(BaseParser):
     def parse(self) -> RuleModel:
+        domains: list[tuple[str, DomainType]] = []
+        # Values of every other plain rule type, inserted in bulk at the end
+        batches: dict[str, list[str]] = {
+            rule_type: [] for rule_type in (*SET_RULE_TYPES, *IP_RULE_TYPES)
+        }
         for line in self.data_lines:
-            segments = line.split(",")
-            rule_type, rule = segments[0].lower(), segments[1].strip()
-            if rule_type == "domain":
-                if not validate_domain(rule):
-                    logger.warning(f"Invalid domain: '{rule}'")
-                    continue
-                self.result.domain_trie.add(rule, DomainType.DOMAIN)
-            elif rule_type == "domain-suffix":
-                if not validate_domain(rule):
+            # Only the value is needed, options such as no-resolve are dropped
+            segments = line.split(",", 2)
+            if len(segments) < 2:
+                logger.warning(line)
+                continue
+            rule_type = segments[0].lower()
+            rule = segments[1].strip()
+            if (domain_type := DOMAIN_RULE_TYPES.get(rule_type)) is not None:
+                if domain_type == DomainType.DOMAIN_WILDCARD or validate_domain(rule):
+                    domains.append((rule, domain_type))
+                else:
                     logger.warning(f"Invalid domain: '{rule}'")
-                    continue
-                self.result.domain_trie.add(rule, DomainType.DOMAIN_SUFFIX)
-            elif rule_type == "domain-keyword":
-                self.result.domain_keyword.add(rule)
-            elif rule_type == "domain-wildcard":
-                self.result.domain_trie.add(rule, DomainType.DOMAIN_WILDCARD)
-            elif rule_type == "ip-cidr":
-                self.result.ip_trie.add(rule)
-            elif rule_type == "ip-cidr6":
-                self.result.ip_trie6.add(rule)
-            elif rule_type == "ip-asn":
-                self.result.ip_asn.add(rule)
-            elif rule_type == "user-agent":
-                self.result.user_agent.add(rule)
-            elif rule_type == "process-name":
-                self.result.process.add(rule)
-            elif is_logical_keyword(rule_type):
+            elif (batch := batches.get(rule_type)) is not None:
+                batch.append(rule)
+            elif rule_type in LOGICAL_RULE_TYPES:
                 node = logic.parse(line)
                 if node is None:
                     continue
                 self.result.logical.add(node)
-            elif rule_type == "url-regex":
-                self.result.url_regex.add(rule)
             else:
                 logger.warning(line)
+
+        for rule_type, field in SET_RULE_TYPES.items():
+            getattr(self.result, field).update(batches[rule_type])
+        for rule_type, field in IP_RULE_TYPES.items():
+            ip_trie = getattr(self.result, field)
+            for rule in batches[rule_type]:
+                try:
+                    ip_trie.add(rule)
+                except ValueError as e:
+                    logger.warning(e)
+        self.result.domain_trie = DomainTrie.from_items(domains)
         return self.result
@@ -1,6 +1,8 @@
 import re
+from typing import NamedTuple
 
 from rule_set.models import (
+    DomainTrie,
     DomainType,
     RuleModel,
     V2rayDomainInclude,
@@ -8,12 +10,39 @@ from rule_set.models import (
     V2rayDomainResult,
 )
 
+from .surge.base import ParserInput, iter_lines
+
 LINE_PATTERN = re.compile(
     r"^(?P<type>domain|keyword|full|regexp|include):(?P<rule>.+?)(?:\s+(?P<attrs>@-?!?\w+(?:\s+@-?!?\w+)*))?$"
 )
 
 
-def parse(data: str, option: V2rayDomainOption) -> V2rayDomainResult:
+class V2rayDomainLine(NamedTuple):
+    rule_type: str
+    rule: str
+    attributes: list[str]
+
+
+def tokenize(data: ParserInput) -> list[V2rayDomainLine]:
+    """Split a V2Ray domain list into typed lines, independent of any option"""
+    lines = []
+    for line in iter_lines(data):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        line = line.split("#", 1)[0].strip()
+        match = LINE_PATTERN.match(line)
+        if match:
+            rule_type, rule, attributes_str = match.group("type", "rule", "attrs")
+            attributes = attributes_str.split() if attributes_str else []
+        else:
+            rule_type = "domain"
+            rule, *attributes = line.split()
+        lines.append(V2rayDomainLine(rule_type, rule, attributes))
+    return lines
+
+
+def parse(data: ParserInput, option: V2rayDomainOption) -> V2rayDomainResult:
     """
     V2Ray domain syntax:
         - Lines starting with '#' are comments and ignored.
@@ -27,23 +56,20 @@ def parse(data: str, option: V2rayDomainOption) -> V2rayDomainResult:
         - Domain rules (domain, keyword, regexp, full) may include one or more
           attributes, each beginning with '@' and separated by spaces (e.g., @ads @cn).
     """
+    return parse_lines(tokenize(data), option)
+
+
+def parse_lines(
+    lines: list[V2rayDomainLine], option: V2rayDomainOption
+) -> V2rayDomainResult:
+    """Apply attribute and include options to already tokenized lines"""
     attribute_rules = option.attrs
     exclude_includes = option.exclude_includes
     rules = RuleModel()
     includes: list[V2rayDomainInclude] = []
+    domains: list[tuple[str, DomainType]] = []
 
-    for line in data.splitlines():
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
-        line = line.split("#", 1)[0].strip()
-        match = LINE_PATTERN.match(line)
-        if match:
-            rule_type, rule, attributes_str = match.group("type", "rule", "attrs")
-            attributes = attributes_str.split() if attributes_str else []
-        else:
-            rule_type = "domain"
-            rule, *attributes = line.split()
+    for rule_type, rule, attributes in lines:
         if rule_type == "include":
             if rule not in exclude_includes:
                 include_attrs, exclude_attrs = [], []
@@ -63,12 +89,13 @@ def parse(data: str, option: V2rayDomainOption) -> V2rayDomainResult:
         if not attribute_rules.matches(attributes):
             continue
         if rule_type == "domain":
-            rules.domain_trie.add(rule, DomainType.DOMAIN_SUFFIX)
+            domains.append((rule, DomainType.DOMAIN_SUFFIX))
         elif rule_type == "keyword":
             rules.domain_keyword.add(rule)
         elif rule_type == "full":
-            rules.domain_trie.add(rule, DomainType.DOMAIN)
+            domains.append((rule, DomainType.DOMAIN))
         elif rule_type == "regexp":
-            rules.domain_trie.add(rule, DomainType.DOMAIN_REGEX)
+            domains.append((rule, DomainType.DOMAIN_REGEX))
 
+    rules.domain_trie = DomainTrie.from_items(domains)
     return V2rayDomainResult(rules=rules, includes=includes)
@@ -1,4 +1,5 @@
 from .resource import ResourceProcessor
+from .scheduler import SourceScheduler
 from .source import SourceProcessor
 
-__all__ = ["ResourceProcessor", "SourceProcessor"]
+__all__ = ["ResourceProcessor", "SourceProcessor", "SourceScheduler"]
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from threading import Lock
+
+
+class RuleMemo[K: Hashable, V]:
+    """
+    Bounded, thread-safe memo of parsed and built rules for a single run.
+
+    Values are shared, not copied: callers must treat them as read-only and
+    merge them into a fresh model instead of mutating them in place. Rule
+    models are normalized before they are put, so that reading them from
+    several threads never writes their lazily built state either.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[K, V] = OrderedDict()
+        self._lock = Lock()
+        self._building: dict[K, Lock] = {}
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_create(self, key: K, factory: Callable[[], V]) -> V:
+        """Return the memoized value, building it at most once across threads"""
+        if (value := self.get(key)) is not None:
+            return value
+        with self._lock:
+            key_lock = self._building.setdefault(key, Lock())
+        try:
+            with key_lock:
+                if (value := self.get(key)) is None:
+                    value = factory()
+                    self.put(key, value)
+                return value
+        finally:
+            with self._lock:
+                self._building.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -1,8 +1,14 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
+from threading import Lock
+
+from loguru import logger
 
 from ..cache import Cache
+from ..config import settings
 from ..errors import UnknownResourceTypeError
-from ..fetcher import fetcher
+from ..fetcher import get_fetcher
 from ..models import (
     BaseResource,
     DomainSetResource,
@@ -14,15 +20,47 @@ from ..models import (
     V2rayDomainOption,
     V2rayDomainResource,
     V2rayDomainResult,
+    snapshot,
 )
 from ..parsers import mmdb, v2ray_domain
 from ..parsers.surge import DomainSetParser, RuleSetParser
+from ..parsers.surge.base import ParserInput
 from ..utils import build_v2ray_include_url
+from .memo import RuleMemo
 
 
 class ResourceProcessor:
     def __init__(self, cache: Cache) -> None:
         self.cache = cache
+        # Run-scoped memos: each unique resource is parsed once per build, and
+        # every attrs variant of a V2Ray list reuses the same tokenized lines.
+        self.parsed_rules: RuleMemo[str, RuleModel | V2rayDomainResult] = RuleMemo(
+            settings.resource_memo_max_entries
+        )
+        self.v2ray_lines: RuleMemo[str, list[v2ray_domain.V2rayDomainLine]] = RuleMemo(
+            settings.resource_memo_max_entries
+        )
+        # MaxMind DB parsing is CPU-bound: it runs in worker processes so that
+        # several databases are parsed at once instead of taking turns on the
+        # GIL. The pool is only started once a database needs parsing.
+        self._mmdb_executor: ProcessPoolExecutor | None = None
+        self._mmdb_executor_lock = Lock()
+
+    def _get_mmdb_executor(self) -> ProcessPoolExecutor:
+        with self._mmdb_executor_lock:
+            if self._mmdb_executor is None:
+                # Spawn: forking a process that runs fetcher and build threads
+                # is unsafe
+                self._mmdb_executor = ProcessPoolExecutor(
+                    max_workers=settings.mmdb_workers, mp_context=get_context("spawn")
+                )
+            return self._mmdb_executor
+
+    def close(self) -> None:
+        with self._mmdb_executor_lock:
+            if self._mmdb_executor is not None:
+                self._mmdb_executor.shutdown(cancel_futures=True)
+                self._mmdb_executor = None
 
     def process(
         self, initial_resource: BaseResource, source_option: Option
@@ -47,23 +85,49 @@ class ResourceProcessor:
         self, resource: BaseResource, source_option: Option
     ) -> RuleModel | V2rayDomainResult:
         cache_key = self._cache_key(resource)
-        if cached_result := self.cache.retrieve(cache_key):
-            if isinstance(resource, V2rayDomainResource):
-                return V2rayDomainResult.model_validate_json(cached_result)
-            return RuleModel.model_validate_json(cached_result)
 
-        if isinstance(resource, MaxMindDBResource):
-            resource_data = fetcher.download_file(resource.source)
-        else:
-            resource_data = fetcher.get_content(resource.source)
+        def load() -> RuleModel | V2rayDomainResult:
+            rules = self._load_rules(cache_key, resource, source_option)
+            rules.normalize()
+            return rules
+
+        return self.parsed_rules.get_or_create(cache_key, load)
+
+    def _load_rules(
+        self, cache_key: str, resource: BaseResource, source_option: Option
+    ) -> RuleModel | V2rayDomainResult:
+        if cached_result := self.cache.retrieve(cache_key, as_bytes=True):
+            try:
+                return snapshot.loads(cached_result)
+            except ValueError as e:
+                logger.warning(f'Ignoring cached rules for "{cache_key}": {e}')
 
         if isinstance(resource, V2rayDomainResource):
-            parsed_rules = self._parse_data(resource_data, resource, resource.option)
+            lines = self.v2ray_lines.get_or_create(
+                str(resource.source),
+                lambda: self._tokenize_v2ray(resource),
+            )
+            parsed_rules = v2ray_domain.parse_lines(lines, resource.option)
         else:
-            parsed_rules = self._parse_data(resource_data, resource, source_option)
-        self.cache.store(cache_key, parsed_rules.model_dump_json())
+            if isinstance(resource, MaxMindDBResource):
+                resource_path = get_fetcher().download_file(resource.source)
+                parsed_rules = self._parse_data(resource_path, resource, source_option)
+            else:
+                # Parsers consume the file line by line while it is open
+                with get_fetcher().open_file(resource.source) as resource_data:
+                    parsed_rules = self._parse_data(
+                        resource_data, resource, source_option
+                    )
+        self.cache.store(cache_key, snapshot.dumps(parsed_rules))
         return parsed_rules
 
+    @staticmethod
+    def _tokenize_v2ray(
+        resource: V2rayDomainResource,
+    ) -> list[v2ray_domain.V2rayDomainLine]:
+        with get_fetcher().open_file(resource.source) as resource_data:
+            return v2ray_domain.tokenize(resource_data)
+
     @staticmethod
     def _cache_key(resource: BaseResource) -> str:
         cache_key = str(resource.source)
@@ -71,9 +135,9 @@ class ResourceProcessor:
             cache_key += f"::attrs={resource.option.attrs}"
         return cache_key
 
-    @staticmethod
     def _parse_data(
-        resource_data: str | list | Path,
+        self,
+        resource_data: ParserInput | Path,
         resource: BaseResource,
         option: Option | V2rayDomainOption,
     ) -> RuleModel | V2rayDomainResult:
@@ -82,7 +146,11 @@ class ResourceProcessor:
         if isinstance(resource, DomainSetResource):
             return DomainSetParser(resource_data).parse()
         if isinstance(resource, MaxMindDBResource):
-            return mmdb.parse(resource_data, country_code=option.geo_ip.country_code)
+            return mmdb.parse(
+                resource_data,
+                country_code=option.geo_ip.country_code,
+                executor=self._get_mmdb_executor(),
+            )
         if isinstance(resource, V2rayDomainResource):
             return v2ray_domain.parse(resource_data, option)
         raise UnknownResourceTypeError(resource)
@@ -0,0 +1,56 @@
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from loguru import logger
+
+from ..config import settings
+from ..sources.registry import SourceRegistry
+from .source import SourceProcessor
+
+
+class SourceScheduler:
+    """Run every source as soon as all of its SourceReference dependencies are built."""
+
+    def __init__(
+        self, source_processor: SourceProcessor, max_workers: int | None = None
+    ) -> None:
+        self.source_processor = source_processor
+        self.max_workers = max_workers or settings.build_workers
+
+    def run(self, registry: SourceRegistry) -> None:
+        sources = {str(source.name): source for source in registry}
+        pending = {name: set(registry.get_dependencies(name)) for name in sources}
+        dependents: dict[str, set[str]] = defaultdict(set)
+        for name, dependencies in pending.items():
+            for dependency in dependencies:
+                dependents[dependency].add(name)
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="source"
+        ) as executor:
+            running: dict[Future[None], str] = {}
+
+            def submit(name: str) -> None:
+                logger.debug(f"Scheduling source: {name}")
+                future = executor.submit(self.source_processor.process, sources[name])
+                running[future] = name
+
+            # Registry order is already topological, keep it for the initial batch
+            for name in sources:
+                if not pending[name]:
+                    submit(name)
+
+            try:
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        future.result()
+                        for dependent in sorted(dependents[name]):
+                            pending[dependent].discard(name)
+                            if not pending[dependent]:
+                                submit(dependent)
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
@@ -1,8 +1,19 @@
+from loguru import logger
+
 from ..cache import Cache
+from ..config import settings
+from ..errors import SourceReferenceError
 from ..file_writers import writer_registry
 from ..metadata import MetadataStore
-from ..models import RuleModel, SerializeFormat, SourceModel, SourceReference
+from ..models import (
+    RuleModel,
+    SerializeFormat,
+    SourceModel,
+    SourceReference,
+    snapshot,
+)
 from ..serializers.clients import client_serializers
+from .memo import RuleMemo
 from .resource import ResourceProcessor
 
 
@@ -16,6 +27,10 @@ class SourceProcessor:
         self.cache = cache
         self.resource_processor = resource_processor
         self.metadata_store = metadata_store
+        # Finished sources, handed straight to dependents built later in the run
+        self.built_rules: RuleMemo[str, RuleModel] = RuleMemo(
+            settings.source_memo_max_entries
+        )
 
     def process(self, source: SourceModel) -> None:
         rules = self._get_rules(source)
@@ -34,25 +49,43 @@ class SourceProcessor:
                 ).write()
 
     def _get_rules(self, source: SourceModel) -> RuleModel:
-        if cached_result := self.cache.retrieve(source.name):
-            return RuleModel.model_validate_json(cached_result, strict=True)
-        return self._process_rules(source)
+        name = str(source.name)
+        rules = self._load_rules(name)
+        if rules is None:
+            rules = self._process_rules(source)
+        rules.normalize()
+        self.built_rules.put(name, rules)
+        return rules
+
+    def _load_rules(self, name: str) -> RuleModel | None:
+        if cached_result := self.cache.retrieve(name, as_bytes=True):
+            try:
+                return snapshot.loads(cached_result)
+            except ValueError as e:
+                logger.warning(f'Ignoring cached rules for "{name}": {e}')
+        return None
+
+    def _get_reference_rules(self, name: str) -> RuleModel:
+        if (rules := self.built_rules.get(name)) is not None:
+            logger.debug(f'Reusing rules of "{name}" built in this run')
+            return rules
+        if (rules := self._load_rules(name)) is None:
+            raise SourceReferenceError(name)
+        return rules
 
     def _process_rules(self, source: SourceModel) -> RuleModel:
         aggregated_rules = RuleModel()
 
         for resource in source.resources:
             if isinstance(resource, SourceReference):
-                aggregated_rules.merge_with(
-                    RuleModel.model_validate_json(self.cache.retrieve(resource.target))
-                )
+                aggregated_rules.merge_with(self._get_reference_rules(resource.target))
             else:
                 aggregated_rules.merge_with(
                     self.resource_processor.process(resource, source.option)
                 )
         aggregated_rules.filter(source.option)
         aggregated_rules.sort()
-        self.cache.store(source.name, aggregated_rules.model_dump_json())
+        self.cache.store(source.name, snapshot.dumps(aggregated_rules))
         return aggregated_rules
 
     @staticmethod
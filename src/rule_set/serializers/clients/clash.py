@@ -3,7 +3,7 @@ from yaml import CDumper
 
 from rule_set.models import Artifact, ArtifactKind, Option, SerializableRuleModel
 
-from ..logic.clash import serialize as logical_serialize
+from ..logic import ClashLogicalSerializer
 from .base import BaseSerializer
 
 ignore_types = ["user_agent", "logical"]
@@ -15,7 +15,7 @@ class ClashSerializer(BaseSerializer):
         self.serialized_logical_rules = list(
             filter(
                 None,
-                [logical_serialize(tree=tree) for tree in self.rules.logical],
+                map(ClashLogicalSerializer().serialize, self.rules.logical),
             )
         )
 
@@ -3,10 +3,17 @@ from yaml import CDumper
 
 from rule_set.models import Artifact, ArtifactKind
 
-from ..logic.egern import serialize as logical_serialize
+from ..logic import EgernLogicalSerializer
 from .base import BaseSerializer
 
 
+class NoAliasDumper(CDumper):
+    """Dumps logical rules sharing subtrees in full, not as anchors"""
+
+    def ignore_aliases(self, data: object) -> bool:
+        return True
+
+
 class EgernSerializer(BaseSerializer):
     def serialize(self) -> list[Artifact]:
         yaml_data = {"no_resolve": self.option.serialization.no_resolve}
@@ -30,8 +37,9 @@ class EgernSerializer(BaseSerializer):
             yaml_data["and_set"] = []
             yaml_data["or_set"] = []
             yaml_data["not_set"] = []
+            logical_serializer = EgernLogicalSerializer()
             for rule in self.rules.logical:
-                if result := logical_serialize(tree=rule):
+                if result := logical_serializer.serialize_set(rule):
                     logical_set, rule = result
                     yaml_data[logical_set].append(rule)
             if not yaml_data["and_set"]:
@@ -49,7 +57,7 @@ class EgernSerializer(BaseSerializer):
                 if key != "no_resolve" and isinstance(value, list):
                     rule_count += len(value)
 
-            yaml_content = yaml.dump(yaml_data, sort_keys=False, Dumper=CDumper)
+            yaml_content = yaml.dump(yaml_data, sort_keys=False, Dumper=NoAliasDumper)
             if rule_count > 0:
                 yaml_content = f"# Total: {rule_count} rules\n# Last Updated: {self.last_updated}\n{yaml_content}"
             return [Artifact(kind=ArtifactKind.DEFAULT, data=yaml_content)]
@@ -1,6 +1,6 @@
 from rule_set.models import Artifact, ArtifactKind
 
-from ..logic import surge_logical_serialize
+from ..logic import SurgeLogicalSerializer
 from .base import BaseSerializer
 
 include_rule_types = [
@@ -43,10 +43,8 @@ class LoonSerializer(BaseSerializer):
 
         rules.extend(f"USER-AGENT,{ua}" for ua in self.rules.user_agent)
 
-        rules.extend(
-            surge_logical_serialize(tree=tree, include=include_rule_types)
-            for tree in self.rules.logical
-        )
+        logical_serializer = SurgeLogicalSerializer(include=include_rule_types)
+        rules.extend(map(logical_serializer.serialize, self.rules.logical))
 
         rules.extend(f"URL-REGEX,{url_regex}" for url_regex in self.rules.url_regex)
         filtered_rules = list(filter(None, rules))
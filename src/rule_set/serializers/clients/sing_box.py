@@ -3,7 +3,7 @@ import json
 from rule_set.models import Artifact, ArtifactKind
 from rule_set.utils import domain
 
-from ..logic import sing_box_logical_serialize
+from ..logic import SingBoxLogicalSerializer
 from .base import BaseSerializer
 
 
@@ -38,8 +38,9 @@ class SingBoxSerializer(BaseSerializer):
             else:
                 json_data["rules"][0]["process_name"] = rules
         if rules := self.rules.logical:
+            logical_serializer = SingBoxLogicalSerializer()
             for rule in rules:
-                logical_rule = sing_box_logical_serialize(tree=rule)
+                logical_rule = logical_serializer.serialize(rule)
                 if logical_rule:
                     json_data["rules"].append(logical_rule)
         if json_data["rules"][0]:
@@ -1,7 +1,7 @@
 from rule_set.models import Artifact, ArtifactKind
 from rule_set.utils.domain import regex_to_wildcard
 
-from ..logic import surge_logical_serialize
+from ..logic import SurgeLogicalSerializer
 from .base import BaseSerializer
 
 include_rule_types = [
@@ -76,10 +76,8 @@ class SurgeSerializer(BaseSerializer):
 
         rules.extend(f"PROCESS-NAME,{process}" for process in self.rules.process)
 
-        rules.extend(
-            surge_logical_serialize(tree=tree, include=include_rule_types)
-            for tree in self.rules.logical
-        )
+        logical_serializer = SurgeLogicalSerializer(include=include_rule_types)
+        rules.extend(map(logical_serializer.serialize, self.rules.logical))
 
         rules.extend(f"URL-REGEX,{url_regex}" for url_regex in self.rules.url_regex)
         rules.extend(
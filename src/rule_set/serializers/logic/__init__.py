@@ -1,4 +1,13 @@
-from .sing_box import serialize as sing_box_logical_serialize
-from .surge import serialize as surge_logical_serialize
+from .base import LogicalVisitor
+from .clash import ClashLogicalSerializer
+from .egern import EgernLogicalSerializer
+from .sing_box import SingBoxLogicalSerializer
+from .surge import SurgeLogicalSerializer
 
-__all__ = [surge_logical_serialize, sing_box_logical_serialize]
+__all__ = [
+    "LogicalVisitor",
+    "SurgeLogicalSerializer",
+    "ClashLogicalSerializer",
+    "EgernLogicalSerializer",
+    "SingBoxLogicalSerializer",
+]
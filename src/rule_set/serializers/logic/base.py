@@ -0,0 +1,87 @@
+from abc import ABC, abstractmethod
+
+from loguru import logger
+
+from rule_set.models.logical import (
+    ConcreteRule,
+    LogicalNode,
+    LogicalTree,
+    NotNode,
+    RuleNode,
+    RuleType,
+)
+
+
+class LogicalVisitor[T](ABC):
+    """
+    Serializes logical trees for one target.
+
+    Parsed trees share their equal subtrees, so results are memoized per
+    node and a subtree is serialized once however many trees contain it.
+    Rules the target cannot express are found by a lookup in
+    supported_types, memoized the same way, before anything is serialized.
+
+    Results are shared between the trees that contain them and must not be
+    modified.
+    """
+
+    supported_types: frozenset[RuleType] = frozenset(RuleType)
+
+    def __init__(self) -> None:
+        self._results: dict[LogicalNode, T] = {}
+        self._unsupported: dict[LogicalNode, ConcreteRule | None] = {}
+
+    def supports(self, rule: ConcreteRule) -> bool:
+        """Whether the target can express rule"""
+        return rule.rule_type in self.supported_types
+
+    @abstractmethod
+    def visit_rule(self, rule: ConcreteRule) -> T: ...
+
+    @abstractmethod
+    def visit_not(self, node: NotNode, child: T) -> T: ...
+
+    @abstractmethod
+    def visit_operator(self, node: LogicalNode, children: list[T]) -> T:
+        """Serialize an AND or OR node"""
+
+    def finish(self, tree: LogicalTree, result: T) -> T:
+        """Turn the result for the root into the one for the whole tree"""
+        return result
+
+    def unsupported_rule(self, node: LogicalNode) -> ConcreteRule | None:
+        """The first rule under node the target cannot express"""
+        if node in self._unsupported:
+            return self._unsupported[node]
+        if type(node) is RuleNode:
+            result = None if self.supports(node.rule) else node.rule
+        else:
+            result = None
+            for child in node.get_children():
+                if (result := self.unsupported_rule(child)) is not None:
+                    break
+        self._unsupported[node] = result
+        return result
+
+    def visit(self, node: LogicalNode) -> T:
+        if (result := self._results.get(node)) is not None:
+            return result
+        if type(node) is RuleNode:
+            result = self.visit_rule(node.rule)
+        elif type(node) is NotNode:
+            result = self.visit_not(node, self.visit(node.child))
+        else:
+            result = self.visit_operator(
+                node, [self.visit(child) for child in node.get_children()]
+            )
+        self._results[node] = result
+        return result
+
+    def serialize(self, tree: LogicalTree) -> T | None:
+        """Serialize tree, or log and skip it if the target cannot express it"""
+        if (rule := self.unsupported_rule(tree.root)) is not None:
+            logger.error(
+                f"rule: {tree!r}, err: Unsupported rule type: {rule.rule_type}"
+            )
+            return None
+        return self.finish(tree, self.visit(tree.root))
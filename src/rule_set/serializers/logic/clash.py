@@ -1,16 +1,12 @@
-from loguru import logger
-
-from rule_set.errors import SerializerError, UnsupportedRuleTypeError
 from rule_set.models.logical import (
-    AndNode,
-    LogicalNodeUnion,
+    ConcreteRule,
+    LogicalNode,
     LogicalTree,
     NotNode,
-    OrNode,
-    RuleNode,
+    RuleType,
 )
 
-from .surge import serialize as surge_serialize
+from .base import LogicalVisitor
 
 include_rule_types = [
     "DOMAIN",
@@ -45,40 +41,36 @@ include_rule_types = [
     "PROTOCOL",
 ]
 type_format = {"PROTOCOL": "NETWORK", "DEST-PORT": "DST-PORT"}
+# Clash only matches the transport as NETWORK
+network_types = {"UDP", "TCP"}
+
+
+class ClashLogicalSerializer(LogicalVisitor[str]):
+    """Serializes trees to Clash classical rules"""
 
+    supported_types = frozenset(
+        rule_type
+        for rule_type in RuleType
+        if type_format.get(rule_type, rule_type) in include_rule_types
+    )
 
-def _serialize_logical(*, node: LogicalNodeUnion) -> str:
-    """Serialize logical node to string."""
-    if isinstance(node, RuleNode):
-        rule_type = type_format.get(node.rule.rule_type, node.rule.rule_type)
-        if rule_type in include_rule_types:
-            if rule_type == "NETWORK" and node.rule.rule_values[0].upper() not in [
-                "UDP",
-                "TCP",
-            ]:
-                raise UnsupportedRuleTypeError(node.rule.rule_type)
-            return f"({rule_type},{','.join(node.rule.rule_values)}),"
-        raise UnsupportedRuleTypeError(node.rule.rule_type)
+    def supports(self, rule: ConcreteRule) -> bool:
+        if rule.rule_type not in self.supported_types:
+            return False
+        if rule.rule_type == RuleType.PROTOCOL:
+            return rule.rule_values[0].upper() in network_types
+        return True
 
-    if isinstance(node, NotNode):
-        rule = f"({node.operator},("
-        rule += _serialize_logical(node=node.child)
-        rule = rule.rstrip(",") + ")),"
-        return rule
+    def visit_rule(self, rule: ConcreteRule) -> str:
+        rule_type = type_format.get(rule.rule_type, rule.rule_type)
+        return f"({rule_type},{','.join(rule.rule_values)})"
 
-    elif isinstance(node, AndNode | OrNode):
-        rule = f"({node.operator},("
-        for child in node.get_children():
-            rule += _serialize_logical(node=child)
-        rule = rule.rstrip(",") + ")),"
-        return rule
+    def visit_not(self, node: NotNode, child: str) -> str:
+        return f"({node.operator},({child}))"
 
+    def visit_operator(self, node: LogicalNode, children: list[str]) -> str:
+        return f"({node.operator},({','.join(children)}))"
 
-def serialize(*, tree: LogicalTree) -> str | None:
-    """Serialize LogicalTree to string."""
-    try:
-        return _serialize_logical(node=tree.root)[1:-2]
-    except UnsupportedRuleTypeError as e:
-        logger.error(f"rule: {surge_serialize(tree=tree)}, err: {e}")
-    except SerializerError as e:
-        logger.error(e)
+    def finish(self, tree: LogicalTree, result: str) -> str:
+        # The root goes without its parentheses
+        return result[1:-1]
@@ -1,14 +1,12 @@
-from loguru import logger
-
-from rule_set.errors import SerializerError, UnsupportedRuleTypeError
 from rule_set.models.logical import (
-    LogicalNodeUnion,
+    ConcreteRule,
+    LogicalNode,
     LogicalTree,
     NotNode,
-    RuleNode,
+    RuleType,
 )
 
-from .surge import serialize as surge_serialize
+from .base import LogicalVisitor
 
 include_type = [
     "DOMAIN",
@@ -46,44 +44,38 @@ type_format = {
 }
 
 
-def _serialize_logical(*, node: LogicalNodeUnion) -> dict[str, dict[str, str | bool]]:
-    if isinstance(node, RuleNode):
-        return format_rule(node.rule.rule_type, node.rule.rule_values)
+type EgernRule = dict[str, dict]
 
-    rule = {}
-    logical_type = f"!{node.operator.lower()}"
-    if isinstance(node, NotNode):
-        rule[logical_type] = {"match": _serialize_logical(node=node.child)}
-    else:
-        rule[logical_type] = {"match": []}
-        for child in node.get_children():
-            rule[logical_type]["match"].append(_serialize_logical(node=child))
-    return rule
 
+class EgernLogicalSerializer(LogicalVisitor[EgernRule]):
+    """
+    Serializes trees to the match blocks of Egern rule sets.
 
-def serialize(
-    *, tree: LogicalTree
-) -> tuple[str, list[dict[str, str]] | dict[str, str]] | None:
-    try:
-        logical_type = tree.root.operator.lower()
-        logical_set, logical_type = f"{logical_type}_set", f"!{logical_type}"
-        return logical_set, _serialize_logical(node=tree.root)[logical_type]
-    except UnsupportedRuleTypeError as e:
-        logger.error(f"rule: {surge_serialize(tree=tree)}, err: {e}")
-    except SerializerError as e:
-        logger.error(e)
+    Shared subtrees are shared dicts, so they must be dumped without YAML
+    aliases.
+    """
+
+    supported_types = frozenset(
+        rule_type for rule_type in RuleType if rule_type in include_type
+    )
 
+    def visit_rule(self, rule: ConcreteRule) -> EgernRule:
+        match = {"match": rule.rule_values[0]}
+        if any(value.lower() == "no-resolve" for value in rule.rule_values[1:]):
+            match["no-resolve"] = True
+        return {f"!{type_format[rule.rule_type]}": match}
 
-def format_rule(
-    rule_type: str, rule_values: list[str]
-) -> dict[str, dict[str, str | bool]]:
-    rule_type = rule_type.upper()
-    if rule_type not in include_type:
-        raise UnsupportedRuleTypeError(rule_type)
-    rule = {f"!{type_format[rule_type]}": {"match": rule_values[0]}}
-    for value in rule_values[1:]:
-        if value.lower() == "no-resolve":
-            rule["match"]["no-resolve"] = True
-            break
+    def visit_not(self, node: NotNode, child: EgernRule) -> EgernRule:
+        return {f"!{node.operator.lower()}": {"match": child}}
 
-    return rule
+    def visit_operator(self, node: LogicalNode, children: list[EgernRule]) -> EgernRule:
+        return {f"!{node.operator.lower()}": {"match": children}}
+
+    def serialize_set(
+        self, tree: LogicalTree
+    ) -> tuple[str, list[EgernRule] | EgernRule] | None:
+        """Serialize tree into the set it goes to and its match block"""
+        if (result := self.serialize(tree)) is None:
+            return None
+        logical_type = tree.root.operator.lower()
+        return f"{logical_type}_set", result[f"!{logical_type}"]
@@ -1,14 +1,11 @@
-from loguru import logger
-
-from rule_set.errors import SerializerError, UnsupportedRuleTypeError
 from rule_set.models.logical import (
-    LogicalNodeUnion,
-    LogicalTree,
+    ConcreteRule,
+    LogicalNode,
     NotNode,
-    RuleNode,
+    RuleType,
 )
 
-from .surge import serialize as surge_serialize
+from .base import LogicalVisitor
 
 type_format = {
     "domain-suffix": "domain_suffix",
@@ -59,65 +56,59 @@ protocol_types = [
 protocol_types_format = {"https": "tls"}
 
 
-def _serialize_logical(
-    *, node: LogicalNodeUnion
-) -> dict[str, list[dict[str, str]] | str]:
-    """Serialize logical node to string."""
-    if isinstance(node, RuleNode):
-        return format_rule(node.rule.rule_type, node.rule.rule_values[0])
-    if isinstance(node, NotNode):
-        return _serialize_not_logical(node=node)
-
-    else:
-        rule = {"type": "logical", "rules": [], "mode": node.operator.lower()}
-        for child_node in node.get_children():
-            rule["rules"].append(_serialize_logical(node=child_node))
-        return rule
-
-
-def _serialize_not_logical(
-    *, node: LogicalNodeUnion, invert: bool = True
-) -> dict[str, list[dict[str, str]] | str]:
-    child_node = node.child
-    if isinstance(child_node, RuleNode):
-        rule = format_rule(child_node.rule.rule_type, child_node.rule.rule_values[0])
-        rule["invert"] = invert
-        return rule
-    if isinstance(child_node, NotNode):
-        return _serialize_not_logical(node=child_node, invert=not invert)
-    rule = {
-        "type": "logical",
-        "rules": [],
-        "mode": child_node.operator.lower(),
-        "invert": invert,
-    }
-    for child in child_node.get_children():
-        rule["rules"].append(_serialize_logical(node=child))
-    return rule
-
-
-def serialize(*, tree: LogicalTree) -> dict | None:
-    try:
-        return _serialize_logical(node=tree.root)
-    except UnsupportedRuleTypeError as e:
-        logger.error(f"rule: {surge_serialize(tree=tree)}, err: {e}")
-    except SerializerError as e:
-        logger.error(e)
-
-
-def format_rule(rule_type: str, rule: str) -> dict[str, str]:
+type SingBoxRule = dict[str, object]
+
+
+def _rule_type(rule_type: str) -> str:
     rule_type = rule_type.lower()
-    rule_type = type_format.get(rule_type, rule_type)
-    if rule_type in include_types:
+    return type_format.get(rule_type, rule_type)
+
+
+def _protocol(rule: ConcreteRule) -> str:
+    protocol = rule.rule_values[0].lower()
+    return protocol_types_format.get(protocol, protocol)
+
+
+class SingBoxLogicalSerializer(LogicalVisitor[SingBoxRule]):
+    """
+    Serializes trees to sing-box headless rules.
+
+    Only the first value of a rule is kept. NOT becomes the invert flag of
+    the rule it negates.
+    """
+
+    supported_types = frozenset(
+        rule_type
+        for rule_type in RuleType
+        if _rule_type(rule_type) in (*include_types, "protocol")
+    )
+
+    def supports(self, rule: ConcreteRule) -> bool:
+        if rule.rule_type not in self.supported_types:
+            return False
+        if rule.rule_type == RuleType.PROTOCOL:
+            protocol = _protocol(rule)
+            return protocol in ("udp", "tcp") or protocol in protocol_types
+        if rule.rule_type == RuleType.DEST_PORT:
+            return rule.rule_values[0].isdigit()
+        return True
+
+    def visit_rule(self, rule: ConcreteRule) -> SingBoxRule:
+        rule_type = _rule_type(rule.rule_type)
         if rule_type == "port":
-            return {"port": int(rule)}
-        return {rule_type: rule}
-    if rule_type == "protocol":
-        rule = rule.lower()
-        rule = protocol_types_format.get(rule, rule)
-        if rule in ["udp", "tcp"]:
-            return {"network": rule}
-        if rule in protocol_types:
-            return {"protocol": rule}
-
-    raise UnsupportedRuleTypeError(rule_type)
+            return {"port": int(rule.rule_values[0])}
+        if rule_type == "protocol":
+            protocol = _protocol(rule)
+            if protocol in ("udp", "tcp"):
+                return {"network": protocol}
+            return {"protocol": protocol}
+        return {rule_type: rule.rule_values[0]}
+
+    def visit_not(self, node: NotNode, child: SingBoxRule) -> SingBoxRule:
+        # Copied, the result for the child is shared
+        return {**child, "invert": not child.get("invert", False)}
+
+    def visit_operator(
+        self, node: LogicalNode, children: list[SingBoxRule]
+    ) -> SingBoxRule:
+        return {"type": "logical", "rules": children, "mode": node.operator.lower()}
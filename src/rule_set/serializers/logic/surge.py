@@ -1,45 +1,36 @@
-from loguru import logger
+from collections.abc import Iterable
 
-from rule_set.errors import SerializerError, UnsupportedRuleTypeError
 from rule_set.models.logical import (
-    AndNode,
-    LogicalNodeUnion,
+    ConcreteRule,
+    LogicalNode,
     LogicalTree,
     NotNode,
-    OrNode,
-    RuleNode,
+    RuleType,
 )
 
+from .base import LogicalVisitor
 
-def _serialize_logical(
-    *, node: LogicalNodeUnion, include: list[str] | None = None
-) -> str:
-    """Serialize logical node to string."""
-    if isinstance(node, RuleNode):
-        rule_type = node.rule.rule_type
-        if include is not None and rule_type.upper() not in include:
-            raise UnsupportedRuleTypeError(rule_type)
-        return f"({rule_type},{','.join(node.rule.rule_values)}),"
-
-    if isinstance(node, NotNode):
-        rule = f"({node.operator},("
-        rule += _serialize_logical(node=node.child, include=include)
-        rule = rule.rstrip(",") + ")),"
-        return rule
-
-    elif isinstance(node, AndNode | OrNode):
-        rule = f"({node.operator},("
-        for child in node.get_children():
-            rule += _serialize_logical(node=child, include=include)
-        rule = rule.rstrip(",") + ")),"
-        return rule
-
-
-def serialize(*, tree: LogicalTree, include: list[str] | None = None) -> str | None:
-    """Serialize LogicalTree to string."""
-    try:
-        return _serialize_logical(node=tree.root, include=include)[1:-2]
-    except UnsupportedRuleTypeError as e:
-        logger.error(f"rule: {serialize(tree=tree)}, err: {e}")
-    except SerializerError as e:
-        logger.error(e)
+
+class SurgeLogicalSerializer(LogicalVisitor[str]):
+    """Serializes trees to Surge rules, such as AND,((DOMAIN,a.com),(PROTOCOL,UDP))"""
+
+    def __init__(self, *, include: Iterable[str] | None = None) -> None:
+        super().__init__()
+        if include is not None:
+            include = {rule_type.upper() for rule_type in include}
+            self.supported_types = frozenset(
+                rule_type for rule_type in RuleType if rule_type in include
+            )
+
+    def visit_rule(self, rule: ConcreteRule) -> str:
+        return f"({rule.rule_type},{','.join(rule.rule_values)})"
+
+    def visit_not(self, node: NotNode, child: str) -> str:
+        return f"({node.operator},({child}))"
+
+    def visit_operator(self, node: LogicalNode, children: list[str]) -> str:
+        return f"({node.operator},({','.join(children)}))"
+
+    def finish(self, tree: LogicalTree, result: str) -> str:
+        # The root goes without its parentheses
+        return result[1:-1]
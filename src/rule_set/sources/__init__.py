@@ -1,4 +1,10 @@
+from functools import cache
+
 from .registry import SourceRegistry
 from .sources import sources
 
-SOURCES = SourceRegistry(sources)
+
+@cache
+def get_sources() -> SourceRegistry:
+    """Resolve the source order on first use, importing the CLI stays cheap"""
+    return SourceRegistry(sources)
@@ -10,8 +10,8 @@ class SourceRegistry:
     def __init__(self, sources: list[SourceModel]):
         # Preprocess sources to handle split_resources
         expanded_sources = self._preprocess_sources(sources)
-        resolver = DependencyResolver(expanded_sources)
-        self._sources = resolver.resolve_order()
+        self._resolver = DependencyResolver(expanded_sources)
+        self._sources = self._resolver.resolve_order()
 
     def _preprocess_sources(self, sources: list[SourceModel]) -> list[SourceModel]:
         """Preprocess sources to handle split_resources expansion"""
@@ -41,6 +41,10 @@ class SourceRegistry:
                 result.append(source)
         return result
 
+    def get_dependencies(self, name: str) -> set[str]:
+        """Get direct dependencies of the specified source"""
+        return self._resolver.get_dependencies(name)
+
     def __iter__(self) -> Iterator[SourceModel]:
         return iter(self._sources)
 
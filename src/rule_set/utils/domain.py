@@ -1,21 +1,115 @@
 import re
 import re._parser as sre_parser
+from functools import cache, lru_cache
+from pathlib import Path
 
-import tldextract
-import validators
+# Snapshot of https://publicsuffix.org/list/public_suffix_list.dat, only its
+# ICANN section is used, as tldextract does by default
+PUBLIC_SUFFIX_LIST = Path(__file__).with_name("public_suffix_list.dat")
+_ICANN_END = "// ===END ICANN DOMAINS==="
+
+# validators.domain(value, rfc_2782=True) of validators 0.35.0, compiled once.
+# Labels may contain underscores, the last label must end with a letter.
+_domain_pattern = re.compile(
+    r"(?:[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?\.)+[a-z0-9][a-z0-9_-]{0,61}[a-z]",
+    re.ASCII | re.IGNORECASE,
+)
+_whitespace_pattern = re.compile(r"\s")
+
+
+@lru_cache(maxsize=4096)
+def _idna_encode(domain: str) -> str | None:
+    try:
+        return domain.encode("idna").decode()
+    except UnicodeError:
+        return None
 
 
 def validate_domain(domain: str) -> bool:
     """Validate domain format."""
     if "." not in domain:
         return True
-    return validators.domain(domain, rfc_2782=True)
+    if "__" in domain:
+        return False
+    if domain.isascii():
+        # The IDNA codec keeps ASCII names as they are. Empty labels or labels
+        # over 63 characters, which it rejects, fail the pattern as well.
+        encoded = domain
+    else:
+        if _whitespace_pattern.search(domain):
+            return False
+        # Internationalized names are rare but slow to encode, and lists
+        # often share them
+        encoded = _idna_encode(domain)
+        if encoded is None:
+            return False
+    return _domain_pattern.fullmatch(encoded) is not None
+
+
+class _SuffixNode:
+    __slots__ = ("children", "end")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _SuffixNode] = {}
+        self.end = False
+
+
+def _decode_label(label: str) -> str:
+    label = label.lower()
+    if label.startswith("xn--"):
+        try:
+            return label[4:].encode().decode("punycode")
+        except UnicodeError:
+            pass
+    return label
+
+
+@cache
+def _public_suffix_trie() -> _SuffixNode:
+    """Build the suffix trie on first use, keyed by labels from the right"""
+    root = _SuffixNode()
+    with PUBLIC_SUFFIX_LIST.open(encoding="utf-8") as file:
+        for line in file:
+            if line.startswith(_ICANN_END):
+                break
+            # A rule is the first word of a line, comments start with "//"
+            rule = line.split(maxsplit=1)[0] if line.strip() else ""
+            if not rule or rule.startswith("//"):
+                continue
+            # Exceptions are stored as "!label" next to the wildcard they
+            # override
+            node = root
+            for label in reversed(rule.lower().split(".")):
+                node = node.children.setdefault(label, _SuffixNode())
+            node.end = True
+    return root
+
+
+def public_suffix_index(labels: list[str]) -> int:
+    """
+    Index of the first label of the public suffix of a domain split into
+    labels, len(labels) when it has none.
+    """
+    node = _public_suffix_trie()
+    index = suffix_index = len(labels)
+    for label in reversed(labels):
+        label = _decode_label(label)
+        child = node.children.get(label)
+        if child is not None:
+            index -= 1
+            node = child
+            if node.end:
+                suffix_index = index
+        elif "*" in node.children:
+            return index if f"!{label}" in node.children else index - 1
+        else:
+            break
+    return suffix_index
 
 
 def is_eTLD(domain: str) -> bool:
     """Check if domain is an effective TLD."""
-    result = tldextract.extract(domain)
-    return domain == result.suffix
+    return public_suffix_index(domain.split(".")) == 0
 
 
 def wildcard_to_regex(domain_wildcard: str) -> str:
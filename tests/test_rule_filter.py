@@ -0,0 +1,42 @@
+from rule_set.models import Option
+from rule_set.models.option import SerializationOption
+from rule_set.parsers.surge import RuleSetParser
+from rule_set.serializers.clients.surge import SurgeSerializer
+
+RULES = "IP-CIDR,1.2.3.0/24\nAND,((IP-CIDR,1.2.3.0/24),(PROTOCOL,UDP))\n"
+
+
+def _filtered(data: str, option: Option):
+    rules = RuleSetParser(data).parse()
+    rules.filter(option)
+    return rules
+
+
+def test_resolving_ip_rule_is_kept_when_plain_rules_do_not_resolve():
+    option = Option()
+    rules = _filtered(RULES, option)
+    assert len(rules.logical) == 1
+
+    rules.sort()
+    content = (
+        SurgeSerializer(rules=rules.to_serializable_rule_model(), option=option)
+        .serialize()[0]
+        .data
+    )
+    assert "IP-CIDR,1.2.3.0/24,no-resolve" in content
+    assert "AND,((IP-CIDR,1.2.3.0/24),(PROTOCOL,UDP))" in content
+
+
+def test_ip_rule_is_covered_when_plain_rules_resolve():
+    option = Option(serialization=SerializationOption(no_resolve=False))
+    assert not _filtered(RULES, option).logical
+
+
+def test_no_resolve_ip_rule_is_covered_by_no_resolve_plain_rules():
+    data = "IP-CIDR,1.2.3.0/24\nAND,((IP-CIDR,1.2.3.0/25,no-resolve),(PROTOCOL,UDP))\n"
+    assert not _filtered(data, Option()).logical
+
+
+def test_resolving_asn_rule_is_kept_when_plain_rules_do_not_resolve():
+    data = "IP-ASN,13335\nOR,((IP-ASN,13335),(DOMAIN,a.com))\n"
+    assert len(_filtered(data, Option()).logical) == 1